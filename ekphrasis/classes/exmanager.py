@@ -1,6 +1,9 @@
 import json
 import os
-import re
+from collections.abc import Mapping
+from threading import Lock
+
+from ekphrasis.utils.regex_backends import compile_expression
 
 
 class ExManager:
@@ -10,11 +13,82 @@ class ExManager:
     with open(ext_path) as fh:
         expressions = json.load(fh)
 
-    def get_compiled(self):
-        regexes = {k.lower(): re.compile(self.expressions[k]) for k, v in
-                   self.expressions.items()}
-        return regexes
+    def get_compiled(self, backend="re"):
+        """
+        The compiled expressions, keyed on their (lowercase) names,
+        in a new dict, which the caller is free to modify.
+
+        Args:
+            backend (str): the regex engine to use (see get_shared)
+        """
+        return dict(self.get_shared(backend))
+
+    def get_shared(self, backend="re"):
+        """
+        The compiled expressions, keyed on their (lowercase) names,
+        in a read-only mapping. Each expression is compiled the first time
+        that it is used and is shared by all the ExManager instances
+        of the process.
+
+        Args:
+            backend (str): the regex engine to use for the expressions that
+                are compatible with it ("re", "regex" or "re2").
+                The rest are compiled with re (see regex_backends).
+        """
+        with _lock:
+            if backend not in _compiled:
+                _compiled[backend] = CompiledExpressions(self.expressions,
+                                                         backend)
+            return _compiled[backend]
 
     def print_expressions(self):
         {print(k.lower(), ":", self.expressions[k])
          for k, v in sorted(self.expressions.items())}
+
+
+class CompiledExpressions(Mapping):
+    """
+    A read-only mapping from the (lowercase) names of the expressions
+    to their compiled regexes, which compiles each one of them lazily.
+    """
+
+    def __init__(self, expressions, backend="re"):
+        self.expressions = {k.lower(): v for k, v in expressions.items()}
+        self.backend = backend
+        self.compiled = {}
+        # the backend that was actually used for each expression
+        self.backends = {}
+        self._lock = Lock()
+
+    def __getitem__(self, key):
+        try:
+            return self.compiled[key]
+        except KeyError:
+            pass
+
+        with self._lock:
+            if key not in self.compiled:
+                self.compiled[key], self.backends[key] = compile_expression(
+                    self.expressions[key], self.backend)
+            return self.compiled[key]
+
+    def report(self):
+        """
+        Report which backend is used for each expression.
+
+        Returns:
+            dict: the name of the backend for each expression
+        """
+        for key in self.expressions:
+            self[key]
+        return dict(self.backends)
+
+    def __iter__(self):
+        return iter(self.expressions)
+
+    def __len__(self):
+        return len(self.expressions)
+
+
+_compiled = {}
+_lock = Lock()
@@ -0,0 +1,632 @@
+import heapq
+import html
+import io
+import math
+import os
+import re
+
+import numpy
+
+from ekphrasis.utils.alignment import CHARREF
+
+"""
+Vectorized ngram counting, for building the statistics of large corpora
+(see tools/generate_stats.py).
+
+Counting the ngrams of a corpus in a dict of strings costs a python string
+and a dict entry (hundreds of bytes) per distinct ngram, plus a string join
+and a hash per occurrence. The NgramCounter instead tokenizes the text in
+large chunks, maps each token to an integer id and packs the ids of each
+ngram into a single uint64 key. The occurrences of a chunk are counted
+with numpy (sort + unique), and the distinct keys of all the chunks
+are merged into flat arrays of keys and counts (16 bytes per ngram).
+The ngrams are decoded back to strings only when they are written.
+
+A uint64 key has 64 // n bits for each token of an n-gram (e.g. 21 bits,
+or 2M distinct tokens, for the 3-grams). Once the vocabulary outgrows them,
+the keys of the order are widened to two or more uint64 words (a numpy
+structured dtype), with fewer tokens in each word (see `NgramCounter.widen`).
+
+The ngrams of each line are counted like this:
+    * 1-grams: the tokens of the line
+    * n-grams: the tokens of the line, after prepending n - 1
+        start-of-line tokens ("<S>")
+
+The ApproxNgramCounter counts the ngrams within a fixed memory budget,
+keeping only the most frequent ones (heavy hitters), with bounded errors.
+
+The counts can also be written to shards, for counting a corpus in parallel
+(map-reduce) or in parts (e.g. the data of each day). A shard is a directory
+with a counts_{n}grams.tsv file for each order, in the format of the
+counts_{n}grams.txt files (the tokens and the count, separated by tabs),
+which contains all the ngrams, sorted. Any number of shards can be merged
+in a single streaming pass (k-way merge), without loading them in memory.
+"""
+
+REGEX_TOKEN = re.compile(r'(?<![#@])\b[a-z]{1,15}\b')
+REGEX_URL = re.compile(
+    r"(https?:\/\/(?:www\.|(?!www))[^\s\.]+\.[^\s]{2,}|www\.[^\s]+\.[^\s]{2,})")
+# the tokens, plus the line breaks, in order to know where each line ends
+REGEX_TOKEN_LINE = re.compile(REGEX_TOKEN.pattern + r'|\n')
+
+
+def unescape(text):
+    """
+    Like html.unescape, but the character references of line breaks
+    (e.g. &#10;) are replaced with spaces, as the line breaks of the text
+    separate its lines.
+    """
+    return CHARREF.sub(
+        lambda m: html.unescape(m.group(0)).replace("\n", " "), text)
+
+
+START = "<S>"
+KEY = numpy.uint64
+
+
+def key_dtype(words):
+    """
+    The dtype of the keys that are packed in a number of uint64 words.
+    """
+    if words == 1:
+        return numpy.dtype(KEY)
+    return numpy.dtype([("w{}".format(i), KEY) for i in range(words)])
+
+
+def key_order(keys):
+    """
+    The (stable) order that sorts the keys.
+    """
+    if keys.dtype.names is None:
+        return numpy.argsort(keys, kind="stable")
+    # much faster than sorting the structured array itself
+    return numpy.lexsort([keys[name] for name in keys.dtype.names[::-1]])
+
+
+def count_keys(keys):
+    """
+    Count the occurrences of the keys.
+
+    Returns:
+        tuple: the sorted unique keys and their counts
+    """
+    if keys.dtype.names is None:
+        keys, counts = numpy.unique(keys, return_counts=True)
+        return keys, counts.astype(numpy.int64)
+    return merge_counts(keys, numpy.ones(len(keys), numpy.int64))
+
+
+def merge_counts(keys, counts):
+    """
+    Sum the counts of the same keys.
+
+    Args:
+        keys (numpy.ndarray): the keys (with duplicates)
+        counts (numpy.ndarray): the count of each key
+
+    Returns:
+        tuple: the sorted unique keys and their total counts
+    """
+    if len(keys) == 0:
+        return keys, counts
+    order = key_order(keys)
+    keys = keys[order]
+    counts = counts[order]
+    starts = numpy.flatnonzero(numpy.r_[True, keys[1:] != keys[:-1]])
+    return keys[starts], numpy.add.reduceat(counts, starts)
+
+
+class NgramCounter:
+    """
+    Exact ngram counts, up to a given order, stored as packed integer keys.
+    """
+
+    def __init__(self, order=2, web_fix=True):
+        """
+        Args:
+            order (int): up-to how many ngrams to count
+            web_fix (bool): remove the urls and unescape the html entities,
+                before tokenizing the text
+        """
+        if not 1 <= order <= 8:
+            raise ValueError("The order should be between 1 and 8!")
+        self.order = order
+        self.web_fix = web_fix
+
+        # the id of each token and the token of each id. <S> is always 0
+        # and the line breaks (which are not counted) are mapped to -1.
+        self.vocab = {START: 0, "\n": -1}
+        self.tokens = [START]
+
+        # the number of token ids that are packed in each uint64 word of the
+        # keys of each order. It is decreased when the vocabulary outgrows
+        # the bits of each id (see widen).
+        self.per_word = {n: n for n in self.ngrams}
+
+        self.keys = {n: numpy.zeros(0, KEY) for n in self.ngrams}
+        self.counts = {n: numpy.zeros(0, numpy.int64) for n in self.ngrams}
+
+        # the counts of the chunks that are not yet merged into the totals.
+        # they are merged once they get larger than the totals, so that each
+        # entry is merged only a few (logarithmic) times.
+        self.pending = {n: [] for n in self.ngrams}
+        self.pending_size = {n: 0 for n in self.ngrams}
+
+    @property
+    def ngrams(self):
+        return range(1, self.order + 1)
+
+    def bits(self, n):
+        """
+        The number of bits of each token id, within the key of an n-gram.
+        """
+        return 64 // self.per_word[n]
+
+    def encode(self, n, columns):
+        """
+        Pack the token ids of n-grams into keys.
+
+        Args:
+            columns (list): n arrays (uint64), with the ids of the first,
+                second, etc. token of each n-gram
+
+        Returns:
+            numpy.ndarray: the keys (see key_dtype)
+        """
+        bits = KEY(self.bits(n))
+        per_word = self.per_word[n]
+        words = []
+        for start in range(0, n, per_word):
+            word = columns[start]
+            for column in columns[start + 1:start + per_word]:
+                word = (word << bits) | column
+            words.append(word)
+        if len(words) == 1:
+            return words[0]
+
+        keys = numpy.empty(len(words[0]), key_dtype(len(words)))
+        for name, word in zip(keys.dtype.names, words):
+            keys[name] = word
+        return keys
+
+    def widen(self, n):
+        """
+        Pack the keys of the n-grams in more uint64 words, with fewer token
+        ids in each one, so that every id of the vocabulary fits in its bits.
+        The order of the keys stays the same.
+        """
+        self.flush(n)
+        ids = self.decode(n, self.keys[n]).astype(KEY)
+        while len(self.tokens) > 2 ** self.bits(n):
+            self.per_word[n] -= 1
+        self.keys[n] = self.encode(n, list(ids.T))
+
+    def token_ids(self, lines):
+        """
+        Tokenize a chunk of lines.
+
+        Returns:
+            tuple: (the id of each token, the line of each token)
+        """
+        text = "".join(line if line.endswith("\n") else line + "\n"
+                       for line in lines)
+        if self.web_fix:
+            text = REGEX_URL.sub(' ', text)
+            text = unescape(text)
+        tokens = REGEX_TOKEN_LINE.findall(text.lower())
+        if not tokens:
+            return numpy.zeros(0, numpy.int64), numpy.zeros(0, numpy.int64)
+
+        for token in sorted(set(tokens).difference(self.vocab)):
+            self.vocab[token] = len(self.tokens)
+            self.tokens.append(token)
+        ids = numpy.fromiter(map(self.vocab.__getitem__, tokens),
+                             numpy.int64, len(tokens))
+
+        breaks = ids < 0
+        lines = numpy.cumsum(breaks)
+        return ids[~breaks], lines[~breaks]
+
+    def pad_lines(self, ids, lines):
+        """
+        Prepend order - 1 <S> tokens to each (non-empty) line.
+
+        Returns:
+            tuple: (ids, lines, the position of each token within its line)
+        """
+        pad = self.order - 1
+        starts = numpy.flatnonzero(numpy.r_[True, lines[1:] != lines[:-1]])
+        if pad:
+            positions = numpy.repeat(starts, pad)
+            ids = numpy.insert(ids, positions, 0)
+            lines = numpy.insert(lines, positions, lines[positions])
+            starts = numpy.flatnonzero(
+                numpy.r_[True, lines[1:] != lines[:-1]])
+
+        lengths = numpy.diff(numpy.r_[starts, len(ids)])
+        offsets = numpy.arange(len(ids)) - numpy.repeat(starts, lengths)
+        return ids, lines, offsets
+
+    def ngram_keys(self, ids, lines, offsets, n):
+        """
+        The packed keys of all the n-grams of a chunk.
+        """
+        m = len(ids) - n + 1
+        if m <= 0:
+            return numpy.zeros(0, KEY)
+
+        # an n-gram should be within a line, and it may start with
+        # at most n - 1 of the order - 1 <S> tokens of the line
+        valid = (lines[:m] == lines[n - 1:]) & (offsets[:m] >= self.order - n)
+
+        ids = ids.astype(KEY)
+        keys = self.encode(n, [ids[k:k + m] for k in range(n)])
+        return keys[valid]
+
+    def add_lines(self, lines):
+        """
+        Count the ngrams of a chunk of lines.
+
+        Args:
+            lines (list): the lines (str) of the chunk
+        """
+        ids, line_ids = self.token_ids(lines)
+        if len(ids) == 0:
+            return
+
+        for n in self.ngrams:
+            if len(self.tokens) > 2 ** self.bits(n):
+                self.widen(n)
+
+        ids, line_ids, offsets = self.pad_lines(ids, line_ids)
+        for n in self.ngrams:
+            keys, counts = count_keys(
+                self.ngram_keys(ids, line_ids, offsets, n))
+            self.add_counts(n, keys, counts)
+
+    def add_counts(self, n, keys, counts):
+        """
+        Add the (sorted, unique) keys and counts of a chunk.
+        """
+        self.pending[n].append((keys, counts))
+        self.pending_size[n] += len(keys)
+        if self.pending_size[n] > len(self.keys[n]):
+            self.flush(n)
+
+    def flush(self, n=None):
+        """
+        Merge the pending counts into the totals.
+        """
+        for n in self.ngrams if n is None else [n]:
+            if not self.pending[n]:
+                continue
+            keys = [self.keys[n]]
+            counts = [self.counts[n]]
+            for k, c in self.pending[n]:
+                keys.append(k)
+                counts.append(c)
+            keys, counts = merge_counts(numpy.concatenate(keys),
+                                        numpy.concatenate(counts))
+            self.keys[n] = keys
+            self.counts[n] = counts
+            self.pending[n] = []
+            self.pending_size[n] = 0
+
+    def prune(self, threshold):
+        """
+        Remove the ngrams with count less than threshold.
+        """
+        self.flush()
+        for n in self.ngrams:
+            keep = self.counts[n] >= threshold
+            self.keys[n] = self.keys[n][keep]
+            self.counts[n] = self.counts[n][keep]
+
+    def size(self, n):
+        """
+        The number of the distinct n-grams (after merging the pending counts).
+        """
+        self.flush(n)
+        return len(self.keys[n])
+
+    def get_counts(self, n):
+        """
+        Returns:
+            numpy.ndarray: the counts of all the distinct n-grams
+        """
+        self.flush(n)
+        return self.counts[n]
+
+    def decode(self, n, keys):
+        """
+        Unpack the keys of n-grams to the ids of their tokens.
+
+        Returns:
+            numpy.ndarray: the ids, with shape (len(keys), n)
+        """
+        bits = self.bits(n)
+        per_word = self.per_word[n]
+        mask = KEY((1 << bits) - 1)
+        if keys.dtype.names is None:
+            words = [keys]
+        else:
+            words = [keys[name] for name in keys.dtype.names]
+
+        ids = numpy.empty((len(keys), n), numpy.int64)
+        for k in range(n):
+            word, position = divmod(k, per_word)
+            # the number of the ids in the word (the last one may have fewer)
+            size = min(per_word, n - word * per_word)
+            shift = KEY(bits * (size - 1 - position))
+            ids[:, k] = (words[word] >> shift) & mask
+        return ids
+
+    def items(self, n, threshold=0):
+        """
+        Iterate over the n-grams with count >= threshold.
+
+        Yields:
+            tuple: (the tokens of the n-gram (tuple), count)
+        """
+        counts = self.get_counts(n)
+        keep = counts >= threshold
+        keys = self.keys[n][keep]
+        counts = counts[keep]
+        tokens = self.tokens
+        for row, count in zip(self.decode(n, keys).tolist(), counts.tolist()):
+            yield tuple(tokens[i] for i in row), count
+
+    def sorted_items(self, n):
+        """
+        Iterate over all the n-grams, in the (lexicographic) order
+        of their tokens.
+
+        Yields:
+            tuple: (the tokens of the n-gram (tuple), count)
+        """
+        self.flush(n)
+
+        # the order of the keys, after replacing the ids of the tokens
+        # with their alphabetical rank, is the order of the ngrams
+        ranks = numpy.empty(len(self.tokens), numpy.int64)
+        ranks[sorted(range(len(self.tokens)), key=self.tokens.__getitem__)] = \
+            numpy.arange(len(self.tokens))
+        ids = ranks[self.decode(n, self.keys[n])]
+        order = numpy.lexsort(ids.T[::-1])
+
+        tokens = self.tokens
+        for row, count in zip(self.decode(n, self.keys[n][order]).tolist(),
+                              self.get_counts(n)[order].tolist()):
+            yield tuple(tokens[i] for i in row), count
+
+    def write_shard(self, path):
+        """
+        Write all the counts to a shard (see `merge_shards`).
+
+        Args:
+            path (str): the directory of the shard
+        """
+        os.makedirs(path, exist_ok=True)
+        for n in self.ngrams:
+            with open(shard_file(path, n), "w", encoding="utf-8") as f:
+                for tokens, count in self.sorted_items(n):
+                    f.write("\t".join(tokens) + "\t" + str(count) + "\n")
+
+
+class ApproxNgramCounter(NgramCounter):
+    """
+    Approximate ngram counts within a fixed memory budget.
+
+    For each order, the memory is split between:
+        * a Misra-Gries summary (the mergeable version of Space-Saving),
+            which keeps at most `capacity` ngrams. When it gets full,
+            the (capacity + 1)-th largest count is subtracted from all
+            the entries and the ones that drop to zero are removed.
+            The total that has been subtracted from each ngram (`error`)
+            is at most total / (capacity + 1), so every ngram with a count
+            larger than it is guaranteed to be kept.
+        * a Count-Min Sketch (depth x width counters), which never
+            underestimates a count and overestimates it by at most
+            e / width * total, with probability 1 - exp(-depth).
+
+    The count of each kept ngram is estimated as
+    min(sketch estimate, summary count + error), so it is never lower than
+    the true count and it is higher by at most the smallest of the two
+    bounds (see `error_bounds`). Unlike pruning the exact counts while
+    counting, an ngram that is dropped early and seen again later is not
+    undercounted.
+
+    The memory of the vocabulary (the distinct tokens) is not included
+    in the budget.
+    """
+
+    def __init__(self, order=2, web_fix=True, memory=1024, depth=4, seed=0):
+        """
+        Args:
+            order (int): up-to how many ngrams to count
+            web_fix (bool): remove the urls and unescape the html entities,
+                before tokenizing the text
+            memory (int): the memory budget for the counts, in MB,
+                which is split equally among the orders
+            depth (int): the number of rows (hash functions) of the sketch
+            seed (int): the seed of the hash functions
+        """
+        super().__init__(order, web_fix)
+
+        # half of the budget of each order goes to the sketch (8 bytes per
+        # counter) and half to the summary (16 bytes per entry, plus the
+        # temporary arrays of its merges)
+        budget = memory * 2 ** 20 // order // 2
+        self.depth = depth
+        self.width_bits = max(int(budget // (depth * 8)).bit_length() - 1, 1)
+        self.width = 2 ** self.width_bits
+        self.capacity = max(budget // 64, 1)
+
+        rng = numpy.random.RandomState(seed)
+        high = numpy.iinfo(numpy.int64).max
+        self.hash_a = rng.randint(0, high, (depth, order),
+                                  numpy.int64).astype(KEY)
+        self.hash_a |= KEY(1)
+        self.hash_b = rng.randint(0, high, depth, numpy.int64).astype(KEY)
+
+        self.sketch = {n: numpy.zeros((depth, self.width), numpy.int64)
+                       for n in self.ngrams}
+        self.total = {n: 0 for n in self.ngrams}
+        self.error = {n: 0 for n in self.ngrams}
+
+    def hashes(self, n, keys):
+        """
+        The columns of the keys of n-grams in each row of the sketch.
+        The token ids of the n-grams are hashed (vector multiply-shift),
+        instead of their keys, so that the columns do not change when
+        the keys are widened.
+        """
+        ids = self.decode(n, keys).astype(KEY)
+        shift = KEY(64 - self.width_bits)
+        for row in range(self.depth):
+            hashed = numpy.full(len(keys), self.hash_b[row])
+            for k in range(n):
+                hashed += ids[:, k] * self.hash_a[row, k]
+            yield (hashed >> shift).astype(numpy.intp)
+
+    def add_counts(self, n, keys, counts):
+        self.total[n] += int(counts.sum())
+
+        weights = counts.astype(numpy.float64)
+        for row, columns in enumerate(self.hashes(n, keys)):
+            self.sketch[n][row] += numpy.bincount(
+                columns, weights, self.width).astype(numpy.int64)
+
+        keys, counts = merge_counts(numpy.concatenate([self.keys[n], keys]),
+                                    numpy.concatenate([self.counts[n], counts]))
+        if len(keys) > self.capacity:
+            # the (capacity + 1)-th largest count
+            cut = numpy.partition(counts, len(keys) - self.capacity - 1)[
+                len(keys) - self.capacity - 1]
+            counts = counts - cut
+            keep = counts > 0
+            keys, counts = keys[keep], counts[keep]
+            self.error[n] += int(cut)
+        self.keys[n] = keys
+        self.counts[n] = counts
+
+    def flush(self, n=None):
+        pass
+
+    def estimate(self, n, keys):
+        """
+        The sketch estimates of the counts of some n-grams (upper bounds).
+        """
+        return numpy.min([self.sketch[n][row][columns] for row, columns
+                          in enumerate(self.hashes(n, keys))], axis=0)
+
+    def get_counts(self, n):
+        return numpy.minimum(self.estimate(n, self.keys[n]),
+                             self.counts[n] + self.error[n])
+
+    def error_bounds(self, n):
+        """
+        The bounds of the errors of the n-gram counts.
+
+        Returns:
+            dict: the parameters of the counter and the bounds.
+                The overestimation of a count is always at most
+                `summary_error` and with probability `sketch_confidence`
+                at most `sketch_error` (`max_error` is the smallest of
+                the two). All the n-grams with a count above `min_count`
+                are guaranteed to be kept.
+        """
+        sketch_error = math.e / self.width * self.total[n]
+        return {
+            "approximate": True,
+            "ngram": n,
+            "total": self.total[n],
+            "capacity": self.capacity,
+            "width": self.width,
+            "depth": self.depth,
+            "summary_error": self.error[n],
+            "sketch_error": sketch_error,
+            "sketch_confidence": 1 - math.exp(-self.depth),
+            "max_error": min(self.error[n], sketch_error),
+            "min_count": self.error[n],
+        }
+
+
+def shard_file(path, n):
+    return os.path.join(path, "counts_{}grams.tsv".format(n))
+
+
+def read_shard(filename):
+    """
+    Iterate over the entries of a counts file.
+
+    Yields:
+        tuple: (the tab-separated tokens of the ngram (str), count)
+    """
+    with open(filename, "r", encoding="utf-8") as f:
+        for line in f:
+            ngram, count = line.rstrip("\n").rsplit("\t", 1)
+            yield ngram, int(count)
+
+
+def merge_shards(paths, n):
+    """
+    Merge the n-gram counts of some shards, in a single pass.
+    The shards that do not contain n-grams are ignored.
+
+    Args:
+        paths (list): the directories of the shards
+        n (int): the order of the ngrams
+
+    Yields:
+        tuple: (the tab-separated tokens of the ngram (str), total count),
+            in the order of the ngrams
+    """
+    files = [shard_file(path, n) for path in paths
+             if os.path.isfile(shard_file(path, n))]
+    ngram, total = None, 0
+    # "\t" sorts before all the characters of the tokens, so the order of
+    # the lines is the lexicographic order of the tuples of the tokens
+    for key, count in heapq.merge(*[read_shard(f) for f in files],
+                                  key=lambda entry: entry[0]):
+        if key != ngram:
+            if ngram is not None:
+                yield ngram, total
+            ngram, total = key, 0
+        total += count
+    if ngram is not None:
+        yield ngram, total
+
+
+def file_ranges(filename, size):
+    """
+    Split a file into byte ranges of about `size` bytes,
+    which start and end at line boundaries.
+
+    Returns:
+        list: (start, end) tuples
+    """
+    length = os.path.getsize(filename)
+    ranges = []
+    start = 0
+    with open(filename, "rb") as f:
+        while start < length:
+            f.seek(min(start + size, length))
+            f.readline()
+            end = min(f.tell(), length)
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+
+def read_range(filename, start, end):
+    """
+    Read the lines of a byte range of a file (see `file_ranges`),
+    like `open(filename, "r", encoding="utf-8", errors="ignore")` does.
+    """
+    with open(filename, "rb") as f:
+        f.seek(start)
+        data = f.read(end - start)
+    text = data.decode("utf-8", errors="ignore")
+    # universal newlines, like the text mode of open()
+    return io.StringIO(text, newline=None)
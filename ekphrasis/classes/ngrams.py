@@ -0,0 +1,459 @@
+import mmap
+import os
+import struct
+import sys
+import threading
+from collections import Counter
+from collections.abc import Mapping
+from math import log10
+from os import path
+from types import MappingProxyType
+from zlib import crc32
+
+import numpy
+
+from ekphrasis.utils.helpers import (check_stats_files, get_stats_dir,
+                                     open_atomic, parse_stats, read_stats)
+
+"""
+Read-only, compact storage for the ngram statistics.
+
+The statistics of the big corpora (e.g. twitter_2018) contain millions of
+entries. Holding them in python dicts costs gigabytes of RAM, which is
+multiplied by the number of worker processes, because the reference count
+updates on the dict entries break the copy-on-write sharing after a fork.
+
+The NgramTable keeps all the ngrams in a few flat buffers (no python object
+per entry), so a table that is loaded once in the parent process,
+is shared by all the forked worker processes without being copied.
+
+The tables are also stored on disk, in a versioned binary format
+(counts_{n}grams.bin), next to the counts_{n}grams.txt files.
+Loading a table from it is a constant-time mmap, instead of a full parse,
+and all the processes that load the same file share its pages.
+
+The tables are opt-in: they are used only with shared_stats=True (see the
+Segmenter, the SpellCorrector and the TextPreProcessor). By default, the
+statistics are still parsed into dicts (see `read_stats`), whose lookups
+are faster than the lookups of a table, at the cost of the slow startup
+and the memory of the dicts.
+
+Binary format (little-endian):
+    * header: magic (8 bytes), version (uint32), padding (uint32),
+        number of ngrams (uint64), number of slots (uint64),
+        blob size in bytes (uint64)
+    * offsets (int64 x (ngrams + 1))
+    * counts (int64 x ngrams)
+    * slots (int64 x slots)
+    * blob
+"""
+
+MAGIC = b"EKPHNGRM"
+VERSION = 1
+HEADER = struct.Struct("<8sIIQQQ")
+
+
+class NgramTable(Mapping):
+    """
+    An immutable mapping from ngrams (str) to their counts (int).
+
+    Storage:
+        * blob: the utf-8 encoded ngrams, sorted and concatenated (bytes)
+        * offsets: the start of each ngram in the blob (n + 1 entries)
+        * counts: the count of each ngram (n entries)
+        * slots: an open addressing hash table (linear probing),
+            which maps the crc32 of an ngram to its index
+    """
+
+    def __init__(self, blob, offsets, counts, slots):
+        self.blob = blob
+        self.offsets = offsets
+        self.counts = counts
+        self.slots = slots
+
+        # memoryviews return python ints, which is faster than indexing
+        # the numpy arrays for single lookups
+        self._offsets = memoryview(offsets)
+        self._counts = memoryview(counts)
+        self._slots = memoryview(slots)
+        self._mask = len(slots) - 1
+
+    @classmethod
+    def from_dict(cls, stats):
+        """
+        Build a table from a dict of counts, like the ones that are
+        returned from `read_stats`.
+        """
+        keys = sorted(stats)
+        encoded = [k.encode("utf-8") for k in keys]
+
+        lengths = numpy.fromiter((len(k) for k in encoded), numpy.int64,
+                                 len(encoded))
+        offsets = numpy.zeros(len(encoded) + 1, dtype=numpy.int64)
+        numpy.cumsum(lengths, out=offsets[1:])
+        counts = numpy.fromiter((stats[k] for k in keys), numpy.int64,
+                                len(keys))
+        hashes = numpy.fromiter((crc32(k) for k in encoded), numpy.int64,
+                                len(encoded))
+
+        return cls(b"".join(encoded), offsets, counts, build_slots(hashes))
+
+    def index(self, key):
+        """
+        Return the position of the ngram in the table, or -1 if missing.
+        """
+        b = key.encode("utf-8")
+        slot = crc32(b) & self._mask
+        while True:
+            i = self._slots[slot]
+            if i < 0:
+                return -1
+            if self.blob[self._offsets[i]:self._offsets[i + 1]] == b:
+                return i
+            slot = (slot + 1) & self._mask
+
+    def key_at(self, i):
+        return str(self.blob[self._offsets[i]:self._offsets[i + 1]], "utf-8")
+
+    def save(self, filename):
+        """
+        Write the table to a file, in the binary format of the module.
+        """
+        header = HEADER.pack(MAGIC, VERSION, 0, len(self.counts),
+                             len(self.slots), len(self.blob))
+        with open_atomic(filename) as f:
+            f.write(header)
+            for array in (self.offsets, self.counts, self.slots):
+                f.write(array.astype("<i8").tobytes())
+            f.write(self.blob)
+
+    @classmethod
+    def load(cls, filename):
+        """
+        Memory-map a table that was written with `save`.
+        Nothing is read from the file, until it is needed for a lookup.
+        """
+        with open(filename, "rb") as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, _, n, n_slots, blob_size = HEADER.unpack_from(buffer)
+        if magic != MAGIC:
+            raise ValueError("{} is not an ngram table!".format(filename))
+        if version != VERSION:
+            raise ValueError("Unsupported version ({}) of ngram table {}. "
+                             "Please regenerate it.".format(version, filename))
+        if sys.byteorder != "little":
+            raise ValueError("Memory-mapped ngram tables are supported "
+                             "only on little-endian machines.")
+
+        start = HEADER.size
+        arrays = []
+        for size in (n + 1, n, n_slots):
+            arrays.append(numpy.frombuffer(buffer, dtype=numpy.int64,
+                                           count=size, offset=start))
+            start += size * 8
+        blob = memoryview(buffer)[start:start + blob_size]
+
+        return cls(blob, *arrays)
+
+    def total(self):
+        """
+        The sum of all the counts.
+        """
+        return int(self.counts.sum())
+
+    def __getitem__(self, key):
+        i = self.index(key)
+        if i < 0:
+            raise KeyError(key)
+        return self._counts[i]
+
+    def get(self, key, default=None):
+        i = self.index(key)
+        if i < 0:
+            return default
+        return self._counts[i]
+
+    def __contains__(self, key):
+        return self.index(key) >= 0
+
+    def __iter__(self):
+        return (self.key_at(i) for i in range(len(self)))
+
+    def __len__(self):
+        return len(self.counts)
+
+
+class NgramValues(Mapping):
+    """
+    A read-only mapping from the ngrams of an NgramTable to the values
+    of an array that is parallel to the counts of the table
+    (e.g. precomputed log counts).
+    """
+
+    def __init__(self, table, values):
+        self.table = table
+        self.values_array = values
+        self._values = memoryview(values)
+
+    def __getitem__(self, key):
+        i = self.table.index(key)
+        if i < 0:
+            raise KeyError(key)
+        return self._values[i]
+
+    def get(self, key, default=None):
+        i = self.table.index(key)
+        if i < 0:
+            return default
+        return self._values[i]
+
+    def __contains__(self, key):
+        return key in self.table
+
+    def __iter__(self):
+        return iter(self.table)
+
+    def __len__(self):
+        return len(self.table)
+
+
+def build_slots(hashes):
+    """
+    Build the hash table of an NgramTable. Each ngram is placed at the first
+    free slot, starting from its hash (linear probing). The insertions are
+    vectorized: in each round, all the pending ngrams try to claim their
+    current slot and the ones that fail, move to the next slot.
+
+    Args:
+        hashes (numpy.ndarray): the hash of each ngram
+
+    Returns:
+        numpy.ndarray: the slots, containing the index of the ngram
+            that is stored in each one of them, or -1 if empty.
+    """
+    # keep the load factor below 0.5, so that the probes are short
+    size = 1
+    while size < 2 * len(hashes):
+        size *= 2
+    mask = size - 1
+
+    slots = numpy.full(size, -1, dtype=numpy.int64)
+    pending = numpy.arange(len(hashes), dtype=numpy.int64)
+    positions = hashes & mask
+
+    while len(pending) > 0:
+        free = numpy.flatnonzero(slots[positions] == -1)
+        claimed, first = numpy.unique(positions[free], return_index=True)
+        slots[claimed] = pending[free[first]]
+
+        placed = numpy.zeros(len(pending), dtype=bool)
+        placed[free[first]] = True
+        pending = pending[~placed]
+        positions = (positions[~placed] + 1) & mask
+
+    return slots
+
+
+def log_counts(stats):
+    """
+    Precompute the log10 of the counts of a table or a dict of counts.
+    """
+    if isinstance(stats, NgramTable):
+        return NgramValues(stats, numpy.log10(stats.counts.astype(float)))
+    return {k: log10(v) for k, v in stats.items()}
+
+
+def total_count(stats):
+    """
+    The sum of the counts of a table or a dict of counts.
+    """
+    if isinstance(stats, NgramTable):
+        return stats.total()
+    return sum(stats.values())
+
+
+def convert_stats(corpus, ngram, stats_dir=None):
+    """
+    Convert the counts_{n}grams.txt file of a corpus to the binary format.
+
+    Args:
+        corpus (str): the name of the corpus
+        ngram (int): the order of the ngrams
+        stats_dir (str): the directory with the statistics of the corpora.
+            Defaults to ~/.ekphrasis/stats.
+
+    Returns:
+        str: the path of the binary file
+    """
+    stats_dir = stats_dir or get_stats_dir()
+    text = path.join(stats_dir, corpus, "counts_{}grams.txt".format(ngram))
+    binary = path.join(stats_dir, corpus, "counts_{}grams.bin".format(ngram))
+
+    NgramTable.from_dict(parse_stats(text)).save(binary)
+    return binary
+
+
+def load_stats_table(corpus, ngram):
+    """
+    Load the ngram statistics of a corpus from their binary file, generating
+    it first from the counts_{n}grams.txt file if missing (or outdated).
+    """
+    stats_dir = get_stats_dir()
+    check_stats_files()
+    text = path.join(stats_dir, corpus, "counts_{}grams.txt".format(ngram))
+    binary = path.join(stats_dir, corpus, "counts_{}grams.bin".format(ngram))
+
+    if os.path.isfile(text):
+        mtime = path.getmtime(binary) if os.path.isfile(binary) else -1
+        if mtime < path.getmtime(text):
+            print("generating binary file for faster loading...")
+            convert_stats(corpus, ngram, stats_dir)
+
+    if os.path.isfile(binary):
+        return NgramTable.load(binary)
+
+    return NgramTable.from_dict(read_stats(corpus, ngram))
+
+
+class StatsRegistry:
+    """
+    A per-process registry of the loaded ngram statistics.
+
+    Each (corpus, ngram, shared) table is loaded once and is handed out
+    to all the Segmenter/SpellCorrector instances that ask for it, so that
+    for example two pre-processors on the same corpus, or a segmenter and
+    a corrector, use the same unigram table. The tables are immutable:
+    an NgramTable (shared=True) or a read-only view of a dict.
+
+    The registry counts the references to each table. A table is dropped
+    when all of its users have released it, or explicitly with `unload`.
+    A release counts only for the table that was acquired, so releasing
+    a table that was unloaded (and maybe loaded again since) does nothing.
+    Forked processes inherit the tables of their parent.
+    """
+
+    def __init__(self):
+        self._tables = {}
+        self._derived = {}
+        self._refs = Counter()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _load(corpus, ngram, shared):
+        if shared:
+            return load_stats_table(corpus, ngram)
+        return MappingProxyType(read_stats(corpus, ngram))
+
+    def acquire(self, corpus, ngram, shared=False):
+        """
+        Get the statistics of a corpus, loading them if needed,
+        and increase their reference count.
+
+        Args:
+            corpus (str): the name of the corpus
+            ngram (int): the order of the ngrams
+            shared (bool): if True, get an NgramTable, which is memory-mapped
+                from its binary file, instead of a (read-only) dict.
+
+        Returns:
+            Mapping: the counts of the ngrams
+        """
+        key = (corpus, ngram, shared)
+        with self._lock:
+            if key not in self._tables:
+                self._tables[key] = self._load(*key)
+            self._refs[key] += 1
+            return self._tables[key]
+
+    def derive(self, corpus, ngram, shared, name, func):
+        """
+        Get data that are derived from a loaded table (e.g. its log counts),
+        computing them with func(table), the first time they are requested.
+        They are shared like the table and are dropped along with it.
+        They are computed without holding the lock of the registry, so if
+        two threads request them at the same time, both compute them and
+        the first result is kept.
+
+        Args:
+            corpus (str): the name of the corpus
+            ngram (int): the order of the ngrams
+            shared (bool): the type of the table (see acquire)
+            name (str): the name of the derived data
+            func (callable): computes the derived data from the table
+
+        Returns:
+            the derived data
+        """
+        key = (corpus, ngram, shared)
+        with self._lock:
+            table = self._tables[key]
+            derived = self._derived.get(key, {})
+            if name in derived:
+                return derived[name]
+
+        value = func(table)
+
+        with self._lock:
+            # keep it only if the table was not dropped in the meantime
+            if self._tables.get(key) is not table:
+                return value
+            return self._derived.setdefault(key, {}).setdefault(name, value)
+
+    def release(self, corpus, ngram, shared=False, table=None):
+        """
+        Decrease the reference count of the statistics of a corpus
+        and drop them if they are no longer used.
+
+        Args:
+            corpus (str): the name of the corpus
+            ngram (int): the order of the ngrams
+            shared (bool): the type of the table (see acquire)
+            table (Mapping): the table that was returned from `acquire`.
+                If it is no longer the loaded table of the corpus
+                (see `unload`), nothing is released. If None,
+                the loaded table is released.
+        """
+        key = (corpus, ngram, shared)
+        with self._lock:
+            if key not in self._tables:
+                return
+            if table is not None and self._tables[key] is not table:
+                return
+            self._refs[key] -= 1
+            if self._refs[key] <= 0:
+                del self._tables[key]
+                del self._refs[key]
+                self._derived.pop(key, None)
+
+    def unload(self, corpus=None, ngram=None):
+        """
+        Drop the loaded statistics (of a given corpus and/or order),
+        regardless of their reference counts. The instances that already
+        hold them, keep working on their own reference.
+
+        Returns:
+            list: the (corpus, ngram, shared) keys of the dropped tables
+        """
+        with self._lock:
+            keys = [k for k in self._tables
+                    if corpus in (None, k[0]) and ngram in (None, k[1])]
+            for key in keys:
+                del self._tables[key]
+                del self._refs[key]
+                self._derived.pop(key, None)
+            return keys
+
+    def info(self):
+        """
+        Report the loaded statistics.
+
+        Returns:
+            list: (corpus, ngram, shared, references, entries) tuples
+        """
+        with self._lock:
+            return [key + (self._refs[key], len(table))
+                    for key, table in self._tables.items()]
+
+
+registry = StatsRegistry()
@@ -1,13 +1,31 @@
 import re
-from functools import lru_cache
+from collections import deque
 
 import ftfy
 
 from ekphrasis.classes.exmanager import ExManager
 from ekphrasis.classes.segmenter import Segmenter
 from ekphrasis.classes.spellcorrect import SpellCorrector
-from ekphrasis.utils.nlp import unpack_contractions
-from ekphrasis.utils.helpers import remove_tags
+from ekphrasis.classes.tokenizer import find_spans
+from ekphrasis.utils.alignment import AlignedText
+from ekphrasis.utils.nlp import CONTRACTIONS, unpack_contractions
+from ekphrasis.utils.cache import LRUCache
+from ekphrasis.utils.helpers import chunks, remove_tags
+
+# Separator used for joining the documents of a batch into a single buffer.
+# None of the expressions used by the pipeline can match across a newline
+# followed by the (ASCII) record separator control character.
+RECORD_SEP = "\x1e"
+DOC_SEP = "\n" + RECORD_SEP + "\n"
+
+REPEATED_SPACES = re.compile(r' +')
+NON_SPACE = re.compile(r'\S+')
+SPACES = re.compile(r'\s+')
+EDGE_SPACE = re.compile(r'^ | $')
+WHOLE_TEXT = re.compile(r'.+', re.DOTALL)
+ALLCAPS_WORD = re.compile(r'[A-Z]+')
+PUNCTS = re.compile(r'[!?.]+')
+
 
 # noinspection PyPackageRequirements
 class TextPreProcessor:
@@ -55,6 +73,10 @@ class TextPreProcessor:
             corrector (str): define the statistics of what corpus you would
                 like to use [english, twitter]
 
+            corrector_index (str): the candidate index of the corrector,
+                for faster spell correction (see SpellCorrector).
+                values [None, "symspell"]
+
             all_caps_tag (str): how to wrap the capitalized words
                 values [single, wrap, every]
                 Note: applicable only when `allcaps` is included in annotate[]
@@ -70,6 +92,29 @@ class TextPreProcessor:
                 spell correction to the text
                 * significantly affects performance (speed)
 
+            shared_stats (bool): keep the word statistics of the segmenter
+                and the corrector in read-only tables, which are memory-mapped
+                and are shared with the worker processes of
+                `pre_process_docs`, instead of copying them to each worker.
+
+            cache_size (int): the maximum number of entries in the cache of
+                each match handler (hashtags, repeated puncts, emphasis...).
+                The caches are keyed on the matched text.
+
+            typed_tokens (bool): tokenize each document first and apply the
+                normalizations and the annotations to the typed tokens
+                (see Tokenizer.tokenize_typed), instead of scanning the text
+                for each one of them and then tokenizing it. For example,
+                the hashtags are unpacked by the type of the tokens, instead
+                of matching the hashtag regex again. Requires a Tokenizer or
+                SocialTokenizer as the tokenizer. The output is not the same,
+                as the tokenizer decides what each part of the text is
+                (see pre_process_doc_typed for the differences).
+
+            type_dicts (dict): dictionaries for replacing the tokens of
+                specific types, e.g. {"LTR_FACE": emoticons}.
+                Applicable only with typed_tokens.
+
             fix_text (bool): choose if you want to fix bad unicode terms and
                 html entities.
             
@@ -87,21 +132,94 @@ class TextPreProcessor:
         self.unpack_hashtags = kwargs.get("unpack_hashtags", False)
         self.segmenter_corpus = kwargs.get("segmenter", "english")
         self.corrector_corpus = kwargs.get("corrector", "english")
+        self.corrector_index = kwargs.get("corrector_index", None)
         self.all_caps_tag = kwargs.get("all_caps_tag", "wrap")
         self.mode = kwargs.get("mode", "normal")
         self.remove_tags = kwargs.get("remove_tags", False)
+        self.shared_stats = kwargs.get("shared_stats", False)
+        self.cache_size = kwargs.get("cache_size", 65536)
+        self.typed_tokens = kwargs.get("typed_tokens", False)
+        self.type_dicts = kwargs.get("type_dicts", {})
 
-        if self.unpack_hashtags:
-            self.segmenter = Segmenter(corpus=self.segmenter_corpus)
-        if self.mode != "fast":
-            self.spell_corrector = SpellCorrector(corpus=self.corrector_corpus)
+        # keep the configuration, in order to be able to re-create
+        # the pre-processor in the worker processes (see pre_process_docs)
+        self.kwargs = kwargs
 
-        self.regexes = ExManager().get_compiled()
+        # the segmenter and the spell corrector are loaded lazily,
+        # the first time that they are needed by a stage of the pipeline
+        self._segmenter = None
+        self._spell_corrector = None
+
+        self.caches = {name: LRUCache(self.cache_size)
+                       for name in ["hashtag", "repeated", "generic",
+                                    "emphasis", "typed"]}
+
+        self.regexes = ExManager().get_shared()
         if 'hashtag' in self.omit or 'hashtag' in self.backoff:
             print("You can't omit/backoff and unpack hashtags!\n "
                   "unpack_hashtags will be set to False")
             self.unpack_hashtags = False
 
+        self.passes = self.annotation_passes()
+
+    @property
+    def segmenter(self):
+        if self._segmenter is None:
+            self._segmenter = Segmenter(corpus=self.segmenter_corpus,
+                                        shared_stats=self.shared_stats)
+        return self._segmenter
+
+    @segmenter.setter
+    def segmenter(self, segmenter):
+        self._segmenter = segmenter
+
+    @property
+    def spell_corrector(self):
+        if self._spell_corrector is None:
+            self._spell_corrector = SpellCorrector(
+                corpus=self.corrector_corpus, shared_stats=self.shared_stats,
+                index=self.corrector_index)
+        return self._spell_corrector
+
+    @spell_corrector.setter
+    def spell_corrector(self, spell_corrector):
+        self._spell_corrector = spell_corrector
+
+    def required_resources(self):
+        """
+        Report the word statistics that the current configuration needs,
+        and which are going to be loaded the first time they are used.
+
+        Returns:
+            list: (component, corpus, ngrams) tuples. For example:
+                [("segmenter", "twitter", [1, 2]),
+                ("spell_corrector", "twitter", [1])]
+        """
+        resources = []
+        if self.unpack_hashtags:
+            resources.append(("segmenter", self.segmenter_corpus, [1, 2]))
+        if self.mode != "fast" and "elongated" in self.include_tags:
+            resources.append(("spell_corrector", self.corrector_corpus, [1]))
+        return resources
+
+    def close(self):
+        """
+        Release the statistics of the loaded components (see StatsRegistry).
+        """
+        for component in (self._segmenter, self._spell_corrector):
+            if component is not None:
+                component.close()
+        self._segmenter = None
+        self._spell_corrector = None
+
+    def load_resources(self):
+        """
+        Load all the resources that the current configuration needs,
+        instead of waiting for the first document that uses them.
+        """
+        for component, corpus, ngrams in self.required_resources():
+            getattr(self, component)
+
     def __copy__(self):
         return self
 
@@ -126,12 +244,15 @@ class TextPreProcessor:
                                   for t in tokens])
             return " " + processed + " "
 
-    @lru_cache(maxsize=65536)
     def handle_hashtag_match(self, m):
         """
         Break a string to its constituent words (using Viterbi algorithm)
         """
-        text = m.group()[1:]
+        return self.caches["hashtag"].get_or_compute(
+            m.group(), self.expand_hashtag, m.group())
+
+    def expand_hashtag(self, hashtag):
+        text = hashtag[1:]
 
         # todo:simplify routine
         if text.islower():
@@ -178,7 +299,6 @@ class TextPreProcessor:
         return text
     
 
-    @lru_cache(maxsize=65536)
     def handle_repeated_puncts(self, m):
         """
         return the sorted set so mathes random combinations of puncts
@@ -188,7 +308,10 @@ class TextPreProcessor:
         :param m:
         :return:
         """
-        text = m.group()
+        return self.caches["repeated"].get_or_compute(
+            m.group(), self.normalize_repeated_puncts, m.group())
+
+    def normalize_repeated_puncts(self, text):
         text = "".join(sorted(set(text), reverse=True))
 
         if "repeated" in self.include_tags:
@@ -196,7 +319,6 @@ class TextPreProcessor:
 
         return text
 
-    @lru_cache(maxsize=65536)
     def handle_generic_match(self, m, tag, mode="every"):
         """
 
@@ -209,30 +331,49 @@ class TextPreProcessor:
 
         """
         text = m.group()
-        text = self.add_special_tag(text, tag, mode=mode)
-
-        return text
+        return self.caches["generic"].get_or_compute(
+            (text, tag, mode), self.add_special_tag, text, tag, mode)
 
-    @lru_cache(maxsize=65536)
     def handle_emphasis_match(self, m):
         """
         :param m:
         :return:
         """
-        text = m.group().replace("*", "")
+        return self.caches["emphasis"].get_or_compute(
+            m.group(), self.normalize_emphasis, m.group())
+
+    def normalize_emphasis(self, text):
+        text = text.replace("*", "")
         if "emphasis" in self.include_tags:
             text = self.add_special_tag(text, "emphasis")
 
         return text
 
+    def cache_info(self):
+        """
+        Report the hits/misses of the caches of the match handlers.
+
+        Returns:
+            dict: the CacheInfo of each cache
+        """
+        return {name: cache.info() for name, cache in self.caches.items()}
+
     @staticmethod
     def dict_replace(wordlist, _dict):
         return [_dict[w] if w in _dict else w for w in wordlist]
 
     @staticmethod
     def remove_hashtag_allcaps(wordlist):
+        mask = TextPreProcessor.hashtag_allcaps_mask(wordlist)
+        return [word for word, keep in zip(wordlist, mask) if keep]
+
+    @staticmethod
+    def hashtag_allcaps_mask(wordlist):
+        """
+        Which words to keep, for removing the allcaps tags within hashtags.
+        """
         in_hashtag = False
-        _words = []
+        _mask = []
         for word in wordlist:
 
             if word == "<hashtag>":
@@ -240,14 +381,17 @@ class TextPreProcessor:
             elif word == "</hashtag>":
                 in_hashtag = False
             elif word in {"<allcaps>", "</allcaps>"} and in_hashtag:
+                _mask.append(False)
                 continue
 
-            _words.append(word)
+            _mask.append(True)
 
-        return _words
-
-    def pre_process_doc(self, doc):
+        return _mask
 
+    def clean_doc(self, doc):
+        """
+        Normalize the spaces and fix the (unicode) text of a raw document.
+        """
         doc = re.sub(r' +', ' ', doc)  # remove repeating spaces
 
         # ###########################
@@ -267,50 +411,78 @@ class TextPreProcessor:
         if self.fix_text:
             doc = ftfy.fix_text(doc)
 
+        return doc
+
+    def annotation_passes(self):
+        """
+        The substitutions of `normalize_doc` for the current configuration,
+        in the order in which they are applied.
+
+        Returns:
+            list: (name, compiled regex, handler) tuples
+        """
+        passes = []
+
         ###########################
         # BACKOFF & OMIT
         ###########################
         for item in self.backoff:
             # better add an extra space after the match.
             # Just to be safe. extra spaces will be normalized later anyway
-            doc = self.regexes[item].sub(lambda m: " " + "<" + item + ">" + " ",
-                                         doc)
+            passes.append((item, self.regexes[item],
+                           lambda m, item=item: " " + "<" + item + ">" + " "))
         for item in self.omit:
-            doc = doc.replace("<" + item + ">", '')
+            passes.append(("omit_" + item, re.compile(re.escape("<" + item + ">")),
+                           lambda m: ''))
 
         ###########################
         # unpack hashtags
         ###########################
         if self.unpack_hashtags:
-            doc = self.regexes["hashtag"].sub(
-                lambda w: self.handle_hashtag_match(w), doc)
+            passes.append(("hashtag", self.regexes["hashtag"],
+                           self.handle_hashtag_match))
 
         ###########################
         # handle special cases
         ###########################
         if self.mode != "fast":
             if "allcaps" in self.include_tags:
-                doc = self.regexes["allcaps"].sub(
-                    lambda w: self.handle_generic_match(w, "allcaps",
-                                                        mode=self.all_caps_tag),
-                    doc)
+                passes.append((
+                    "allcaps", self.regexes["allcaps"],
+                    lambda w: self.handle_generic_match(
+                        w, "allcaps", mode=self.all_caps_tag)))
 
             if "elongated" in self.include_tags:
-                doc = self.regexes["elongated"].sub(
-                    lambda w: self.handle_elongated_match(w), doc)
+                passes.append(("elongated", self.regexes["elongated"],
+                               self.handle_elongated_match))
 
             if "repeated" in self.include_tags:
-                doc = self.regexes["repeat_puncts"].sub(
-                    lambda w: self.handle_repeated_puncts(w), doc)
+                passes.append(("repeated", self.regexes["repeat_puncts"],
+                               self.handle_repeated_puncts))
 
             if "emphasis" in self.include_tags:
-                doc = self.regexes["emphasis"].sub(
-                    lambda w: self.handle_emphasis_match(w), doc)
+                passes.append(("emphasis", self.regexes["emphasis"],
+                               self.handle_emphasis_match))
 
             if "censored" in self.include_tags:
-                doc = self.regexes["censored"].sub(
-                    lambda w: self.handle_generic_match(w, "censored"), doc)
-        
+                passes.append((
+                    "censored", self.regexes["censored"],
+                    lambda w: self.handle_generic_match(w, "censored")))
+
+        return passes
+
+    def normalize_doc(self, doc, clean=True):
+        """
+        Apply all the string level transformations (normalization, hashtag
+        unpacking, annotation, contraction unpacking) to a document.
+        The result is still a string, which has not been tokenized yet.
+        """
+        if clean:
+            doc = self.clean_doc(doc)
+
+        for name, regex, handler in self.passes:
+            doc = regex.sub(handler, doc)
+
         ###########################
         # unpack contractions: i'm -> i am, can't -> can not...
         ###########################
@@ -319,6 +491,13 @@ class TextPreProcessor:
         if self.unpack_contractions:
             doc = unpack_contractions(doc)
 
+        return doc
+
+    def tokenize_doc(self, doc):
+        """
+        Turn a normalized document (the output of `normalize_doc`)
+        into the final output of the pipeline.
+        """
         if self.remove_tags:
             doc = remove_tags(doc)
      
@@ -344,7 +523,414 @@ class TextPreProcessor:
 
         return doc
 
-    def pre_process_docs(self, docs, lazy=True):
+    def pre_process_doc(self, doc):
+        if self.typed_tokens:
+            return [token for token, _type in self.pre_process_doc_typed(doc)]
+        return self.tokenize_doc(self.normalize_doc(doc))
+
+    def pre_process_doc_typed(self, doc):
+        """
+        Pre-process a document on its typed tokens: the document is tokenized
+        (after cleaning it and unpacking its contractions) and then each
+        normalization/annotation is applied only to the tokens of the
+        relevant type, using the same handlers as `normalize_doc`:
+            * normalize: the tokens of the type (e.g. URL for "url")
+            * allcaps: runs of capitalized WORD tokens
+            * elongated: WORD tokens
+            * repeated: runs of adjacent "!", "?" and "." tokens
+            * emphasis, censored: EMPHASIS and CENSORED tokens
+            * unpack_hashtags: HASHTAG tokens
+
+        Unlike normalize_doc, the tokenizer decides what each part of the text
+        is, so the output differs wherever the tokens of the tokenizer
+        disagree with the matches of the individual regexes, which is common
+        in social text:
+            * each normalization/annotation applies only to whole tokens of
+              its type. With normalize=["number"], the numbers within the
+              tokens of other types are kept, e.g. "$10", "20%" and
+              "12/05/2017", instead of "$ <number>", "<number> %"...
+            * a token of one type is never split by the regex of another, so
+              the tokenizer's choice wins: "<3" stays an emoticon (instead of
+              "<" and a number), "f**kguuuuud" is censored (not elongated)
+              and "@https://t.co/x" is a user (not "@" and a url).
+            * the hashtags are the HASHTAG tokens, so "#1" and
+              "#Hello_World-2" are unpacked as a whole (instead of "# <number>"
+              and "#Hello_World" followed by "-2"). The plain Tokenizer has no
+              HASHTAG type, so with it the hashtags are not unpacked at all.
+            * allcaps wraps runs of capitalized WORD tokens, so it never wraps
+              a part of another token (e.g. the "D" of ":-D"), but it does
+              wrap a capitalized word that is glued to another token
+              (e.g. the "ABC" of "5$ABC").
+        The annotations that are added are of type TAG.
+
+        Returns:
+            list: (token, type) pairs
+        """
+        tokenizer = getattr(self.tokenizer, "__self__", None)
+        if not hasattr(tokenizer, "tokenize_spans"):
+            raise ValueError("typed tokens require a Tokenizer "
+                             "or SocialTokenizer as the tokenizer")
+
+        doc = self.clean_doc(doc)
+        if self.unpack_contractions:
+            doc = unpack_contractions(doc)
+
+        # [token, type, start, end] (the spans are used for the adjacency)
+        tokens = [[token, _type, start, end] for start, end, token, _type
+                  in find_spans(tokenizer, doc, lowercase=False)]
+
+        backoff = {item.upper(): "<" + item + ">" for item in self.backoff}
+        if backoff:
+            tokens = [[backoff[t[1]]] + t[1:] if t[1] in backoff else t
+                      for t in tokens]
+        for item in self.omit:
+            tokens = [t for t in tokens if t[0] != "<" + item + ">"]
+
+        if self.mode != "fast":
+            if "allcaps" in self.include_tags:
+                tokens = self.typed_allcaps(tokenizer, tokens, doc)
+            if "elongated" in self.include_tags:
+                tokens = self.typed_sub(tokenizer, tokens, "WORD",
+                                        self.regexes["elongated"],
+                                        self.handle_elongated_match)
+            if "repeated" in self.include_tags:
+                tokens = self.typed_repeated(tokenizer, tokens)
+            if "emphasis" in self.include_tags:
+                tokens = self.typed_sub(tokenizer, tokens, "EMPHASIS",
+                                        self.regexes["emphasis"],
+                                        self.handle_emphasis_match)
+            if "censored" in self.include_tags:
+                tokens = self.typed_sub(
+                    tokenizer, tokens, "CENSORED", self.regexes["censored"],
+                    lambda w: self.handle_generic_match(w, "censored"))
+
+        if self.unpack_hashtags:
+            tokens = self.typed_sub(tokenizer, tokens, "HASHTAG",
+                                    self.regexes["hashtag"],
+                                    self.handle_hashtag_match)
+
+        if self.remove_tags:
+            tokens = [t for t in tokens if t[0][0] != '<']
+
+        if tokenizer.lowercase:
+            tokens = [[t[0].lower()] + t[1:] for t in tokens]
+
+        typed = [(t[0], t[1]) for t in tokens]
+        if self.dicts:
+            for d in self.dicts:
+                typed = [(d[t] if t in d else t, _type) for t, _type in typed]
+        for _type, d in self.type_dicts.items():
+            typed = [(d[t] if t in d and tt == _type else t, tt)
+                     for t, tt in typed]
+
+        return typed
+
+    def retype(self, tokenizer, text, _type, start, end):
+        """
+        Tokenize the replacement of typed token(s). The tags
+        (e.g. "<elongated>") are of type TAG and the rest keep the type
+        and the span of the original token(s).
+        """
+        tokens = self.caches["typed"].get_or_compute(
+            (text, id(tokenizer)), self.split_replacement, tokenizer, text)
+        return [[token, "TAG" if is_tag else _type, start, end]
+                for token, is_tag in tokens]
+
+    def split_replacement(self, tokenizer, text):
+        return [(token, self.regexes["tag"].fullmatch(token) is not None)
+                for _, _, token, _
+                in find_spans(tokenizer, text, lowercase=False)]
+
+    def typed_sub(self, tokenizer, tokens, _type, regex, handler):
+        """
+        Apply a handler (like regex.sub) to the typed tokens of a type.
+        """
+        _tokens = []
+        for t in tokens:
+            if t[1] == _type:
+                text = regex.sub(handler, t[0])
+                if text != t[0]:
+                    _tokens.extend(self.retype(tokenizer, text, *t[1:]))
+                    continue
+            _tokens.append(t)
+        return _tokens
+
+    def typed_allcaps(self, tokenizer, tokens, doc):
+        """
+        Annotate the runs of capitalized WORD tokens, which are separated
+        only by spaces, like the allcaps regex does.
+        """
+        capitalized = ALLCAPS_WORD.fullmatch
+
+        _tokens = []
+        run = []
+
+        def flush():
+            text = " ".join(t[0] for t in run)
+            if len(text) >= 3:
+                mode = self.all_caps_tag
+                text = self.caches["generic"].get_or_compute(
+                    (text, "allcaps", mode), self.add_special_tag,
+                    text, "allcaps", mode)
+                _tokens.extend(self.retype(tokenizer, text, "WORD",
+                                           run[0][2], run[-1][3]))
+            else:
+                _tokens.extend(run)
+            del run[:]
+
+        for t in tokens:
+            if t[1] == "WORD" and capitalized(t[0]):
+                if run and doc[run[-1][3]:t[2]].strip(" "):
+                    flush()
+                run.append(t)
+            else:
+                if run:
+                    flush()
+                _tokens.append(t)
+        if run:
+            flush()
+        return _tokens
+
+    def typed_repeated(self, tokenizer, tokens):
+        """
+        Normalize the runs of adjacent "!", "?" and "." tokens,
+        like the repeat_puncts regex does.
+        """
+        _tokens = []
+        run = []
+
+        def flush():
+            text = "".join(t[0] for t in run)
+            if len(text) > 1:
+                text = self.caches["repeated"].get_or_compute(
+                    text, self.normalize_repeated_puncts, text)
+                _tokens.extend(self.retype(tokenizer, text, run[0][1],
+                                           run[0][2], run[-1][3]))
+            else:
+                _tokens.extend(run)
+            del run[:]
+
+        for t in tokens:
+            if PUNCTS.fullmatch(t[0]):
+                if run and run[-1][3] != t[2]:
+                    flush()
+                run.append(t)
+            else:
+                if run:
+                    flush()
+                _tokens.append(t)
+        if run:
+            flush()
+        return _tokens
+
+    def pre_process_doc_spans(self, doc):
+        """
+        Pre-process a document like `pre_process_doc`, but keep track of
+        the character offsets of the original document, through all the
+        stages of the pipeline. Each token is aligned to the span of the
+        text that it comes from, so the tokens that were added by the
+        normalization/annotation (e.g. "<hashtag>", "<elongated>") are
+        aligned to the text that they normalize or annotate.
+
+        Notes:
+            * with fix_text, each chunk of non-space characters is fixed
+              separately, since ftfy can't report what it changed. If that
+              gives a different text than fixing the whole document,
+              the whole document is used as the span of all the tokens.
+            * with a custom tokenizer (not one of ekphrasis),
+              the tokens are aligned by looking for them in the text.
+
+        Returns:
+            list: (start, end, token, type) tuples, where type is the name
+                of the expression that matched the token (see
+                Tokenizer.tokenize_spans) or None if unknown.
+        """
+        aligned = AlignedText(doc)
+
+        # clean_doc
+        aligned = aligned.sub(REPEATED_SPACES, ' ')
+        if self.fix_text:
+            fixed = ftfy.fix_text(aligned.text)
+            chunked = aligned.sub(NON_SPACE,
+                                  lambda m: ftfy.fix_text(m.group()))
+            if chunked.text == fixed:
+                aligned = chunked
+            else:
+                aligned = aligned.sub(WHOLE_TEXT, lambda m: fixed)
+
+        # normalize_doc
+        for name, regex, handler in self.passes:
+            aligned = aligned.sub(regex, handler)
+        if self.unpack_contractions:
+            for regex, template in CONTRACTIONS:
+                aligned = aligned.sub(regex, template)
+
+        # tokenize_doc
+        if self.remove_tags:
+            aligned = aligned.sub(
+                NON_SPACE, lambda m: '' if m.group()[0] == '<' else m.group())
+        mask = iter(self.hashtag_allcaps_mask(aligned.text.split()))
+        aligned = aligned.sub(NON_SPACE,
+                              lambda m: m.group() if next(mask) else '')
+        aligned = aligned.sub(SPACES, ' ').sub(EDGE_SPACE, '')
+
+        if self.tokenizer:
+            tokenizer = getattr(self.tokenizer, "__self__", None)
+            if hasattr(tokenizer, "tokenize_spans"):
+                spans = tokenizer.tokenize_spans(aligned.text)
+            else:
+                spans = self.align_tokens(aligned.text,
+                                          self.tokenizer(aligned.text))
+            if self.dicts:
+                for d in self.dicts:
+                    spans = [(start, end, d[t] if t in d else t, _type)
+                             for start, end, t, _type in spans]
+        else:
+            spans = [(m.start(), m.end(), m.group(), None)
+                     for m in NON_SPACE.finditer(aligned.text)]
+
+        return [aligned.span(start, end) + (token, _type)
+                for start, end, token, _type in spans]
+
+    @staticmethod
+    def align_tokens(text, tokens):
+        """
+        Find the offsets of the tokens of an arbitrary tokenizer in a text,
+        by looking for each one of them after the previous one.
+        The tokens that are not found are aligned to an empty span.
+        """
+        spans = []
+        cursor = 0
+        for token in tokens:
+            start = text.find(token, cursor)
+            if start < 0:
+                spans.append((cursor, cursor, token, None))
+            else:
+                cursor = start + len(token)
+                spans.append((start, cursor, token, None))
+        return spans
+
+    def pre_process_batch(self, docs):
+        """
+        Pre-process a list of documents in one call.
+
+        The documents are joined into a single buffer, using a separator
+        that none of the expressions can match across, so that each of the
+        normalization/annotation passes runs once over the whole batch,
+        instead of once per document. The buffer is then split back and
+        each document is tokenized separately.
+
+        Documents that contain the separator themselves are processed one
+        by one, as well as the whole batch, if for any reason the separator
+        does not survive the normalization.
+
+        Args:
+            docs (list): the documents (strings) to be processed
+
+        Returns:
+            list: the processed documents, in the same order as `docs`
+        """
+        docs = list(docs)
+        if self.typed_tokens:
+            return [self.pre_process_doc(d) for d in docs]
+
+        batch = [d for d in docs if RECORD_SEP not in d]
+
+        if len(batch) > 1:
+            # ftfy removes control characters, including the separator
+            if self.fix_text:
+                buffer = DOC_SEP.join(self.clean_doc(d) for d in batch)
+                normalized = self.normalize_doc(buffer, clean=False)
+            else:
+                normalized = self.normalize_doc(DOC_SEP.join(batch))
+            normalized = normalized.split(RECORD_SEP)
+            if len(normalized) != len(batch):
+                normalized = [self.normalize_doc(d) for d in batch]
+        else:
+            normalized = [self.normalize_doc(d) for d in batch]
+
+        normalized = iter(normalized)
+        return [self.tokenize_doc(next(normalized))
+                if RECORD_SEP not in d else self.pre_process_doc(d)
+                for d in docs]
+
+    def pre_process_docs(self, docs, lazy=True, n_jobs=1, chunksize=1000):
+        """
+        Pre-process a collection of documents, yielding the processed
+        documents in the same order as in `docs`.
+
+        Args:
+            docs (iterable): the documents (strings) to be processed
+            lazy (bool): unused, kept for backwards compatibility
+            n_jobs (int): the number of worker processes to use.
+                Each worker builds its own pre-processor (and its own
+                Segmenter and SpellCorrector) once, from the configuration
+                of this instance. If -1, use all the available cores.
+            chunksize (int): the number of documents that are sent to each
+                worker at a time. Used only if n_jobs != 1.
+
+        Raises:
+            ValueError: if n_jobs is not a positive number or -1,
+                or chunksize is not positive (raised on the call,
+                not when the documents are consumed)
+        """
+        if n_jobs != -1 and n_jobs < 1:
+            raise ValueError("n_jobs must be a positive number or -1, "
+                             "got {}".format(n_jobs))
+        if chunksize < 1:
+            raise ValueError("chunksize must be a positive number, "
+                             "got {}".format(chunksize))
+
+        if n_jobs == 1:
+            return self._pre_process_serial(docs)
+
+        from multiprocessing import cpu_count
+
+        if n_jobs == -1:
+            n_jobs = cpu_count()
+        return self._pre_process_parallel(docs, n_jobs, chunksize)
+
+    def _pre_process_serial(self, docs):
         from tqdm import tqdm
+
         for d in tqdm(docs, desc="PreProcessing..."):
             yield self.pre_process_doc(d)
+
+    def _pre_process_parallel(self, docs, n_jobs, chunksize):
+        from multiprocessing import Pool
+        from tqdm import tqdm
+
+        # forked workers inherit the (shared) statistics of the parent
+        if self.shared_stats:
+            self.load_resources()
+
+        with Pool(n_jobs, initializer=_init_worker,
+                  initargs=(self.kwargs,)) as pool, \
+                tqdm(desc="PreProcessing...") as progress:
+            # don't feed the whole input to the pool at once.
+            # keep at most 2 chunks per worker in flight.
+            pending = deque()
+            for chunk in chunks(docs, chunksize):
+                pending.append(pool.apply_async(_process_chunk, (chunk,)))
+                if len(pending) >= 2 * n_jobs:
+                    processed = pending.popleft().get()
+                    progress.update(len(processed))
+                    yield from processed
+
+            while pending:
+                processed = pending.popleft().get()
+                progress.update(len(processed))
+                yield from processed
+
+
+# the pre-processor of each worker process (see pre_process_docs)
+_worker_processor = None
+
+
+def _init_worker(kwargs):
+    global _worker_processor
+    _worker_processor = TextPreProcessor(**kwargs)
+
+
+def _process_chunk(docs):
+    return _worker_processor.pre_process_batch(docs)
@@ -1,9 +1,11 @@
+import os
 import re
-from functools import lru_cache
+from collections.abc import Mapping
 from math import log10
 
 from ekphrasis.classes.exmanager import ExManager
-from ekphrasis.utils.helpers import read_stats
+from ekphrasis.classes.ngrams import log_counts, registry, total_count
+from ekphrasis.utils.cache import make_cache
 
 """
 The Segmenter Class implements the Viterbi algorithm for word segmentation.
@@ -14,57 +16,123 @@ REGEX_TOKEN = re.compile(r'\b[a-z]{2,}\b')
 NGRAM_SEP = "_"  # todo: move to values
 
 
-class Pdist(dict):
+class Pdist(Mapping):
     """
     A probability distribution estimated from word counts
     Notice: if pw = Pdist(unigrams, n_tokens:
         * pw[w] is the raw count of the word w
         * pw(w) is the probability of the word w
+        * pw.logp(w) is the log10 probability of the word w, computed from
+            the precomputed log10 counts (and the log10 of the total)
+
+    The counts are not copied, so a Pdist can sit on top of
+    a (shared) NgramTable.
     """
 
     @staticmethod
     def default_unk_func(key, total):
         return 1. / total
 
-    def __init__(self, data=None, total=None, unk_func=None, **kwargs):
-        super().__init__(**kwargs)
-
-        # insert the word counts
-        data = data or {}
-        for key, count in data.items():
-            self[key] = self.get(key, 0) + int(count)
+    @staticmethod
+    def default_log_unk_func(key, total):
+        return -log10(total)
 
-        self.total = float(total or sum(self.values()))
+    def __init__(self, data=None, total=None, unk_func=None,
+                 log_unk_func=None, logcounts=None):
+        """
+        Args:
+            data (Mapping): the counts
+            total (int): the sum of the counts
+            unk_func (callable): the probability of an unknown key
+            log_unk_func (callable): the log10 probability of an unknown key
+            logcounts (Mapping): the precomputed log10 of the counts.
+                If None, they are computed here.
+        """
+        self.counts = data if data is not None else {}
+        self.total = float(total or total_count(self.counts))
         self.unk_prob = unk_func or self.default_unk_func
 
+        self.logcounts = logcounts if logcounts is not None \
+            else log_counts(self.counts)
+        self.log_total = log10(self.total)
+        self.log_unk_prob = log_unk_func or self.default_log_unk_func
+
+    def logp(self, key):
+        logcount = self.logcounts.get(key)
+        if logcount is None:
+            return self.log_unk_prob(key, self.total)
+        return logcount - self.log_total
+
+    def __getitem__(self, key):
+        return self.counts[key]
+
+    def __contains__(self, key):
+        return key in self.counts
+
+    def __iter__(self):
+        return iter(self.counts)
+
+    def __len__(self):
+        return len(self.counts)
+
     def __call__(self, key):
-        if key in self:
-            return self[key] / self.total
+        if key in self.counts:
+            return self.counts[key] / self.total
         else:
             return self.unk_prob(key, self.total)
 
 
 class Segmenter:
-    def __init__(self, corpus="english", max_split_length=20):
+    def __init__(self, corpus="english", max_split_length=20,
+                 shared_stats=False, cache_size=65536, cache_policy="lru",
+                 cache_file=None):
         """
         Args:
             corpus (str): the statistics from which corpus to use for
                 the spell correction.
             max_split_length (int): the maximum length of that a word can have
                 for looking for splits
+            shared_stats (bool): if True, keep the statistics in read-only
+                NgramTables, which are memory-mapped from their binary files
+                and are shared with the forked worker processes,
+                instead of dicts.
+            cache_size (int): the maximum number of entries in each one
+                of the caches of the segmenter (segment and find_segment).
+                if you don't have enough RAM lower the cache_size.
+            cache_policy (str): the eviction policy of the caches,
+                "lru" (least recently used) or "lfu" (least frequently used).
+            cache_file (str): a file with segmentations, written with
+                `save_cache`, which is used for warming up the cache of
+                `segment`, if it exists.
+
+        The statistics are taken from the process-wide registry, so all the
+        instances on the same corpus share them. Call `close` to release them.
         """
 
         # self.unigrams = Counter(read_stats(corpus, 1))
         # self.bigrams = Counter(read_stats(corpus, 2))
-        self.unigrams = read_stats(corpus, 1)
-        self.bigrams = read_stats(corpus, 2)
-        self.N = sum(self.unigrams.values())
+        self.unigrams = registry.acquire(corpus, 1, shared_stats)
+        self.bigrams = registry.acquire(corpus, 2, shared_stats)
+        self.stats = [(corpus, 1, shared_stats, self.unigrams),
+                      (corpus, 2, shared_stats, self.bigrams)]
+        self.N = total_count(self.unigrams)
         self.L = max_split_length
 
-        self.Pw = Pdist(self.unigrams, self.N, self.unk_probability)
-        self.P2w = Pdist(self.bigrams, self.N)
+        # the log10 counts are computed once and shared through the registry
+        self.Pw = Pdist(self.unigrams, self.N, self.unk_probability,
+                        self.log_unk_probability,
+                        registry.derive(corpus, 1, shared_stats, "log10",
+                                        log_counts))
+        self.P2w = Pdist(self.bigrams, self.N,
+                         logcounts=registry.derive(corpus, 2, shared_stats,
+                                                   "log10", log_counts))
+
+        self.case_split = ExManager().get_shared()["camel_split"]
 
-        self.case_split = ExManager().get_compiled()["camel_split"]
+        self.segment_cache = make_cache(cache_size, cache_policy)
+        self.find_segment_cache = make_cache(cache_size, cache_policy)
+        if cache_file is not None and os.path.isfile(cache_file):
+            self.load_cache(cache_file)
 
     def condProbWord(self, word, prev):
         """
@@ -82,6 +150,18 @@ class Segmenter:
         except KeyError:
             return self.Pw(word)
 
+    def condLogProbWord(self, word, prev):
+        """
+        log10 of the conditional probability of word, given previous word
+        (see condProbWord), from the precomputed log10 counts:
+        log P(word|prev) = log C(prev_word) - log C(prev)
+        """
+        try:
+            return self.P2w.logcounts[prev + NGRAM_SEP + word] - \
+                self.Pw.logcounts[prev]
+        except KeyError:
+            return self.Pw.logp(word)
+
     @staticmethod
     def unk_probability(key, total):
         """
@@ -92,6 +172,22 @@ class Segmenter:
         """
         return 10. / (total * 10 ** len(key))
 
+    @staticmethod
+    def log_unk_probability(key, total):
+        """
+        The log10 of unk_probability, in closed form:
+        log10(10 / (total * 10^len(key))) = 1 - log10(total) - len(key)
+        """
+        return 1. - log10(total) - len(key)
+
+    def close(self):
+        """
+        Release the statistics of the segmenter from the registry.
+        """
+        for key in self.stats:
+            registry.release(*key)
+        self.stats = []
+
     @staticmethod
     def combine(first, rem):
         """
@@ -113,8 +209,6 @@ class Segmenter:
         return [(text[:i + 1], text[i + 1:])
                 for i in range(min(len(text), self.L))]
 
-    # if you don't have enough RAM lower the maxsize
-    @lru_cache(maxsize=65536)
     def find_segment(self, text, prev='<S>'):
         """
         Return (log P(words), words), where words is the best estimated segmentation
@@ -124,18 +218,100 @@ class Segmenter:
         """
         if not text:
             return 0.0, []
-        candidates = [self.combine((log10(self.condProbWord(first, prev)), first), self.find_segment(rem, first))
-                      for first, rem in self.splits(text)]
-        return max(candidates)
+        return self.find_segment_cache.get_or_compute(
+            (text, prev), self._find_segment, text, prev)
+
+    def _find_segment(self, text, prev):
+        """
+        Iterative (dynamic programming) Viterbi, from the end of the text
+        to its start. Because of the bigrams, the score of the segmentation
+        of a suffix depends on the word before it, so the state is the pair
+        (position, previous word) and there are at most L previous words
+        for each position: O(n*L) states with L transitions each,
+        without recursion and without copying lists of words.
+
+        best[i][p] holds the (log P, length of the first word) of the best
+        segmentation of text[i:], given that the previous word is p.
+        The words are recovered in the end, by following the lengths.
+        """
+        n = len(text)
+        best = [None] * (n + 1)
+
+        for i in range(n - 1, -1, -1):
+            if i == 0:
+                prevs = [prev]
+            else:
+                prevs = [text[j:i] for j in range(max(0, i - self.L), i)]
+
+            best_i = {}
+            for p in prevs:
+                if p in best_i:
+                    continue
+                top = None
+                for k in range(1, min(n - i, self.L) + 1):
+                    word = text[i:i + k]
+                    rest = best[i + k][word][0] if i + k < n else 0.0
+                    score = self.condLogProbWord(word, prev=p) + rest
+                    # break the ties like max() on (score, words) tuples.
+                    # the first words of the tied segmentations are prefixes
+                    # of each other, so the list with the longer one wins.
+                    if top is None or score >= top[0]:
+                        top = (score, k)
+                best_i[p] = top
+            best[i] = best_i
+
+        score, k = best[0][prev]
+        return score, self.backtrack(best, text, 0, k)
+
+    @staticmethod
+    def backtrack(best, text, i, k):
+        """
+        Recover the words of the segmentation of text[i:],
+        which starts with a word of length k.
+        """
+        words = []
+        while True:
+            word = text[i:i + k]
+            words.append(word)
+            i += k
+            if i == len(text):
+                return words
+            k = best[i][word][1]
 
-    # if you don't have enough RAM lower the maxsize
-    @lru_cache(maxsize=65536)
     def segment(self, word):
+        return self.segment_cache.get_or_compute(word, self._segment, word)
+
+    def _segment(self, word):
         if word.islower():
             return " ".join(self.find_segment(word)[1])
         else:
             return self.case_split.sub(r' \1', word).lower()
 
+    def cache_info(self):
+        """
+        Report the hits/misses of the caches of the segmenter.
+
+        Returns:
+            dict: the CacheInfo of the segment and find_segment caches
+        """
+        return {"segment": self.segment_cache.info(),
+                "find_segment": self.find_segment_cache.info()}
+
+    def cache_clear(self):
+        self.segment_cache.clear()
+        self.find_segment_cache.clear()
+
+    def save_cache(self, filename):
+        """
+        Write the cached segmentations (word -> segmentation) to a file,
+        in order to warm up the cache of a new segmenter with them
+        (see `cache_file` and `load_cache`).
+        """
+        self.segment_cache.save(filename)
+
+    def load_cache(self, filename):
+        self.segment_cache.load(filename)
+
     def demo(self):
         print("BBCtest: ", self.segment('BbcTest'))
         print("choosespain: ", self.segment('choosespain'))
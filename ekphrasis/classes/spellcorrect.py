@@ -1,11 +1,14 @@
 import re
-from collections import Counter
 from difflib import SequenceMatcher
 from functools import lru_cache
+from itertools import groupby, product
 
-from ekphrasis.utils.helpers import read_stats
+from ekphrasis.classes.ngrams import registry, total_count
+from ekphrasis.classes.spellindex import load_spell_index
+from ekphrasis.utils.cache import LRUCache
 
 REGEX_TOKEN = re.compile(r'\b[a-z]{2,}\b')
+REGEX_WORD = re.compile(r'[a-zA-Z]+')
 
 
 class SpellCorrector:
@@ -14,14 +17,60 @@ class SpellCorrector:
     spell-corrector in http://norvig.com/spell-correct.html
     """
 
-    def __init__(self, corpus="english"):
+    def __init__(self, corpus="english", shared_stats=False, index=None,
+                 max_distance=None):
         """
 
         :param corpus: the statistics from which corpus to use for the spell correction.
+        :param shared_stats: if True, keep the statistics in a read-only
+            NgramTable, which is memory-mapped from its binary file and is
+            shared with the forked worker processes, instead of a dict.
+        :param index: the way to generate the candidates of a word.
+            - None: generate all the edits of the word and keep the known ones
+            - "symspell": lookup the words within the edit distance in a
+              precomputed symmetric delete index (see SymSpellIndex).
+              Much faster, especially with fast=False. The index is built
+              once from the vocabulary of the corpus, is saved next to its
+              statistics and is memory-mapped on load.
+        :param max_distance: the maximum edit distance of the candidates
+            (1, 2 or 3). If None, it is 1 with fast=True and 2 otherwise.
+            If given, it overrides `fast`. Distance 3 is supported only
+            with an index, as its edits are far too many to generate.
+
+        The statistics are taken from the process-wide registry, so all the
+        instances on the same corpus share them. Call `close` to release them.
         """
         super().__init__()
-        self.WORDS = Counter(read_stats(corpus, 1))
-        self.N = sum(self.WORDS.values())
+        if index not in (None, "symspell"):
+            raise ValueError("Unknown index: {}".format(index))
+        if max_distance not in (None, 1, 2, 3):
+            raise ValueError("max_distance must be 1, 2 or 3")
+        if index is None and max_distance == 3:
+            raise ValueError("max_distance=3 requires an index")
+        self.max_distance = max_distance
+
+        self.WORDS = registry.acquire(corpus, 1, shared_stats)
+        self.stats = [(corpus, 1, shared_stats, self.WORDS)]
+        self.N = total_count(self.WORDS)
+
+        # the best normalization of each run-length key (see best_elong_candidate)
+        self.elong_cache = LRUCache(65536)
+
+        if index is None:
+            self.index = None
+        else:
+            distance = max(2, max_distance or 2)
+            self.index = registry.derive(
+                corpus, 1, shared_stats, "symspell_d{}".format(distance),
+                lambda words: load_spell_index(corpus, words, distance))
+
+    def close(self):
+        """
+        Release the statistics of the corrector from the registry.
+        """
+        for key in self.stats:
+            registry.release(*key)
+        self.stats = []
 
     @staticmethod
     def tokens(text):
@@ -31,7 +80,7 @@ class SpellCorrector:
         """
         Probability of `word`.
         """
-        return self.WORDS[word] / self.N
+        return self.WORDS.get(word, 0) / self.N
 
     def most_probable(self, words):
         _known = self.known(words)
@@ -75,6 +124,12 @@ class SpellCorrector:
         Generate possible spelling corrections for word.
         """
 
+        if self.index is not None:
+            return self.index_candidates(word, assume_wrong, fast)
+
+        if self.max_distance is not None:
+            fast = self.max_distance == 1
+
         if fast:
             if assume_wrong:
                 return self.known(self.edit_step(word)) or [word]
@@ -87,6 +142,28 @@ class SpellCorrector:
             else:
                 return self.known([word]) or self.known(self.edit_step(word)) or self.known(self.edits2(word)) or [word]
 
+    def index_candidates(self, word, assume_wrong=False, fast=True):
+        """
+        The same candidates as edit_candidates, found with the index:
+        the known words at the smallest distance (up to max_distance, or
+        if not set, up to 1 if fast, else up to 2). Like the edits, the word
+        itself is a candidate (at distance 0) when it is known, unless it is
+        assumed wrong, in which case it can still be picked among the
+        distance-1 words.
+        """
+        max_distance = self.max_distance or (1 if fast else 2)
+        found = self.index.lookup(word, max_distance)
+
+        if not assume_wrong and word in found:
+            return [word]
+
+        for distance in range(1, max_distance + 1):
+            candidates = [w for w, d in found.items()
+                          if d == distance or (distance == 1 and d == 0)]
+            if candidates:
+                return candidates
+        return [word]
+
     # def distance_candidates(self, word, max_distance=3):
     #     """
     #     Generate possible spelling corrections for word.
@@ -105,7 +182,7 @@ class SpellCorrector:
         """
         Correct all the words within a text, returning the corrected text."""
 
-        return re.sub('[a-zA-Z]+', self.correct_match, text)
+        return REGEX_WORD.sub(self.correct_match, text)
 
     def correct_match(self, match):
         """
@@ -122,6 +199,56 @@ class SpellCorrector:
 
         return self.case_of(word)(self.correct(word.lower(), assume_wrong=assume_wrong, fast=fast))
 
+    def resolve(self, words, assume_wrong=False, fast=False):
+        """
+        Correct each one of the (lowercase) words once.
+        Unless assume_wrong, the known words are kept as they are,
+        so only the out-of-vocabulary words are corrected.
+
+        Returns:
+            dict: the correction of each word
+        """
+        resolved = {}
+        for word in set(words):
+            if not assume_wrong and word in self.WORDS:
+                resolved[word] = word
+            else:
+                resolved[word] = self.correct(word, assume_wrong=assume_wrong,
+                                              fast=fast)
+        return resolved
+
+    def correct_batch(self, tokens, assume_wrong=False, fast=False):
+        """
+        Spell-correct a batch of tokens, like correct_word, but each distinct
+        word (type) is corrected only once. In social text a small set of
+        misspellings makes up most of the errors, so this removes most of the
+        work for large batches.
+
+        Returns:
+            list: the corrected tokens, preserving the case of each token
+        """
+        lowered = [token.lower() for token in tokens]
+        resolved = self.resolve(lowered, assume_wrong=assume_wrong, fast=fast)
+        return [self.case_of(token)(resolved[word])
+                for token, word in zip(tokens, lowered)]
+
+    def correct_texts(self, texts):
+        """
+        Correct all the words within each one of the texts, like correct_text,
+        but each distinct word is corrected only once for all the texts.
+
+        Returns:
+            list: the corrected texts
+        """
+        resolved = self.resolve(word.lower() for text in texts
+                                for word in REGEX_WORD.findall(text))
+
+        def correct_match(match):
+            word = match.group()
+            return self.case_of(word)(resolved[word.lower()])
+
+        return [REGEX_WORD.sub(correct_match, text) for text in texts]
+
     @staticmethod
     def case_of(text):
         """
@@ -133,21 +260,54 @@ class SpellCorrector:
                 str.title if text.istitle() else
                 str)
 
+    @staticmethod
+    def run_lengths(word):
+        """
+        Encode a word as (char, run) pairs, with the runs capped at 2,
+        e.g. "soooo" -> (("s", 1), ("o", 2)).
+        All the elongations of a word share the same encoding.
+        """
+        return tuple((c, min(len(list(run)), 2)) for c, run in groupby(word))
+
+    @staticmethod
+    def run_length_candidates(runs):
+        """
+        All the words that can be produced from the (char, run) pairs of
+        `run_lengths`, by keeping each repeated character once or twice,
+        e.g. (("s", 1), ("o", 2)) -> {"so", "soo"}.
+        """
+        options = [(c, c + c) if run > 1 else (c,) for c, run in runs]
+        return {"".join(variant) for variant in product(*options)}
+
     def elong_normalized_candidates(self, word, acc=None):
+        """
+        The normalizations of an elongated word (see run_length_candidates),
+        appended to `acc`, followed by the word itself.
+        """
         if acc is None:
             acc = []
-        candidates = [w for w in set(word) if word.count(w) > 1]
-        for c in candidates:
-            _w = word.replace(c + c, c)
-            if _w in acc:
-                continue
-            acc.append(_w)
-            self.elong_normalized_candidates(_w, acc)
+        seen = set(acc)
+        seen.add(word)
+        for candidate in sorted(self.run_length_candidates(
+                self.run_lengths(word))):
+            if candidate not in seen:
+                seen.add(candidate)
+                acc.append(candidate)
         return acc + [word]
 
     def best_elong_candidate(self, word):
-        candidates = self.elong_normalized_candidates(word)
-        best = self.most_probable(candidates)
+        """
+        The most probable normalization of an elongated word. The candidates
+        depend only on the run-length encoding of the word, so the best one
+        is computed once for each encoding and is cached. The word itself
+        is also a candidate, in case it is a known word with longer runs.
+        """
+        runs = self.run_lengths(word)
+        best = self.elong_cache.get_or_compute(
+            runs, lambda: self.most_probable(
+                self.run_length_candidates(runs)))
+        if word in self.WORDS and (not best or self.P(word) > self.P(best)):
+            return word
         return best or word
 
     def normalize_elongated(self, word):
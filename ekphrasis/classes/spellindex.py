@@ -0,0 +1,316 @@
+import mmap
+import os
+from math import comb
+import struct
+import sys
+from itertools import combinations
+from os import path
+from zlib import crc32
+
+import numpy
+
+from ekphrasis.utils.helpers import get_stats_dir, open_atomic
+
+"""
+Candidate generation for the SpellCorrector, based on the symmetric delete
+algorithm of SymSpell (https://github.com/wolfgarbe/SymSpell).
+
+Instead of generating all the strings within a given edit distance from
+a word (edits of ~54n+25 strings at distance 1 and its square at distance 2)
+and looking each one of them up in the vocabulary, we precompute the
+deletes of every word of the vocabulary (up to max_distance characters).
+Two words are within distance d only if they share a delete (of at most
+d characters from each one of them), so the candidates of a word are found
+with a handful of lookups, one for each of its own deletes, and are then
+verified with the exact (Damerau-Levenshtein) distance.
+
+The deletes are not stored as strings, but as the (sorted) crc32 hashes,
+along with the id of the word that they come from. Hash collisions only
+add a few false candidates, which are rejected by the verification.
+
+The index is stored next to the statistics of the corpus
+(~/.ekphrasis/stats/<corpus>/spellindex_d{max_distance}.bin) and is
+memory-mapped on load, so it is built only once and all the processes
+that load it share its pages.
+
+Binary format (little-endian):
+    * header: magic (8 bytes), version (uint32), max distance (uint32),
+        number of words (uint64), number of deletes (uint64),
+        blob size in bytes (uint64), size (uint64) and modification
+        time in ns (uint64) of the counts file of the vocabulary
+    * offsets (int64 x (words + 1))
+    * hashes (uint32 x deletes)
+    * ids (int32 x deletes)
+    * blob
+"""
+
+MAGIC = b"EKPHSPIX"
+VERSION = 1
+HEADER = struct.Struct("<8sIIQQQQQ")
+
+
+def deletes(word, max_distance):
+    """
+    All the strings that are produced by deleting up to `max_distance`
+    characters from `word` (including the word itself).
+    """
+    positions = range(len(word))
+    _deletes = {word}
+    for d in range(1, min(max_distance, len(word)) + 1):
+        for removed in combinations(positions, d):
+            _deletes.add("".join(c for i, c in enumerate(word)
+                                 if i not in removed))
+    return _deletes
+
+
+def damerau_levenshtein(a, b, max_distance=None):
+    """
+    The (unrestricted) Damerau-Levenshtein distance between a and b,
+    which is the minimum number of insertions, deletions, substitutions
+    and transpositions of adjacent characters, that turn a into b.
+    This is the distance that is covered by the edits of SpellCorrector.
+
+    If max_distance is given, any distance above it is reported
+    as max_distance + 1, which allows skipping the computation
+    for words with very different lengths.
+    """
+    if max_distance is not None and abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+
+    inf = len(a) + len(b)
+    last_row = {}
+
+    # the matrix has an extra row and column, which hold "infinity"
+    rows = [[inf] * (len(b) + 2)]
+    rows.append([inf] + list(range(len(b) + 1)))
+    for i in range(1, len(a) + 1):
+        rows.append([inf, i] + [0] * len(b))
+
+    for i in range(1, len(a) + 1):
+        last_match_col = 0
+        for j in range(1, len(b) + 1):
+            k = last_row.get(b[j - 1], 0)
+            col = last_match_col
+            if a[i - 1] == b[j - 1]:
+                cost = 0
+                last_match_col = j
+            else:
+                cost = 1
+            rows[i + 1][j + 1] = min(rows[i][j] + cost,
+                                     rows[i + 1][j] + 1,
+                                     rows[i][j + 1] + 1,
+                                     rows[k][col] + (i - k - 1) + 1 + (j - col - 1))
+        last_row[a[i - 1]] = i
+
+    distance = rows[len(a) + 1][len(b) + 1]
+    if max_distance is not None and distance > max_distance:
+        return max_distance + 1
+    return distance
+
+
+class SymSpellIndex:
+    """
+    A symmetric delete index over a vocabulary, which finds all the words
+    within a given edit distance from a (possibly misspelled) word.
+
+    Storage (flat arrays, so that the index can be memory-mapped):
+        * blob: the utf-8 encoded words, sorted and concatenated (bytes)
+        * offsets: the start of each word in the blob (n + 1 entries)
+        * hashes: the sorted crc32 hashes of the deletes of all the words
+        * ids: the id of the word, from which each delete comes from
+    """
+
+    def __init__(self, blob, offsets, hashes, ids, max_distance=2):
+        self.max_distance = max_distance
+        self.blob = blob
+        self.offsets = offsets
+        self.hashes = hashes
+        self.ids = ids
+        self._offsets = memoryview(offsets)
+
+    @classmethod
+    def from_words(cls, words, max_distance=2):
+        """
+        Build the index of a vocabulary.
+
+        Args:
+            words (iterable): the vocabulary
+            max_distance (int): the maximum edit distance of the lookups
+        """
+        words = sorted(words)
+        encoded = [w.encode("utf-8") for w in words]
+        lengths = numpy.fromiter((len(w) for w in encoded), numpy.int64,
+                                 len(encoded))
+        offsets = numpy.zeros(len(encoded) + 1, dtype=numpy.int64)
+        numpy.cumsum(lengths, out=offsets[1:])
+
+        # the number of deletes of a word without repeated characters,
+        # which bounds the number of its (distinct) deletes
+        capacity = sum(comb(len(w), d) for w in words
+                       for d in range(min(max_distance, len(w)) + 1))
+        hashes = numpy.empty(capacity, dtype=numpy.uint32)
+        ids = numpy.empty(capacity, dtype=numpy.int32)
+
+        n = 0
+        for i, word in enumerate(words):
+            _deletes = deletes(word, max_distance)
+            end = n + len(_deletes)
+            hashes[n:end] = numpy.fromiter(
+                (crc32(d.encode("utf-8")) for d in _deletes),
+                numpy.uint32, len(_deletes))
+            ids[n:end] = i
+            n = end
+
+        hashes = hashes[:n]
+        order = numpy.argsort(hashes, kind="stable")
+
+        return cls(b"".join(encoded), offsets, hashes[order], ids[:n][order],
+                   max_distance)
+
+    def word_at(self, i):
+        return str(self.blob[self._offsets[i]:self._offsets[i + 1]], "utf-8")
+
+    def save(self, filename, source=None):
+        """
+        Write the index to a file, in the binary format of the module.
+
+        Args:
+            filename (str): the path of the file
+            source (str): the file with the counts, from which
+                the vocabulary of the index comes from. Its size and
+                modification time are kept in the header, in order to
+                detect if the index is outdated (see `load`).
+        """
+        signature = source_signature(source)
+        if signature is None:
+            raise ValueError("{} does not exist!".format(source))
+        size, mtime = signature
+        header = HEADER.pack(MAGIC, VERSION, self.max_distance,
+                             len(self.offsets) - 1, len(self.hashes),
+                             len(self.blob), size, mtime)
+        with open_atomic(filename) as f:
+            f.write(header)
+            f.write(self.offsets.astype("<i8").tobytes())
+            f.write(self.hashes.astype("<u4").tobytes())
+            f.write(self.ids.astype("<i4").tobytes())
+            f.write(self.blob)
+
+    @classmethod
+    def load(cls, filename, source=None):
+        """
+        Memory-map an index that was written with `save`.
+
+        Returns:
+            SymSpellIndex: the index, or None if it is outdated,
+                i.e. if it was not built from the current `source`
+                (or with an older version of the format), or if the
+                `source` is missing and it cannot be checked.
+        """
+        with open(filename, "rb") as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        (magic, version, max_distance, n_words, n_deletes, blob_size,
+         size, mtime) = HEADER.unpack_from(buffer)
+        if magic != MAGIC:
+            raise ValueError("{} is not a spell index!".format(filename))
+        signature = source_signature(source)
+        if version != VERSION or signature != (size, mtime):
+            return None
+        if sys.byteorder != "little":
+            raise ValueError("Memory-mapped spell indexes are supported "
+                             "only on little-endian machines.")
+
+        start = HEADER.size
+        offsets = numpy.frombuffer(buffer, dtype=numpy.int64,
+                                   count=n_words + 1, offset=start)
+        start += (n_words + 1) * 8
+        hashes = numpy.frombuffer(buffer, dtype=numpy.uint32,
+                                  count=n_deletes, offset=start)
+        start += n_deletes * 4
+        ids = numpy.frombuffer(buffer, dtype=numpy.int32,
+                               count=n_deletes, offset=start)
+        start += n_deletes * 4
+        blob = memoryview(buffer)[start:start + blob_size]
+
+        return cls(blob, offsets, hashes, ids, max_distance)
+
+    def lookup(self, word, max_distance=None):
+        """
+        Find the words of the vocabulary within `max_distance` from `word`.
+
+        Returns:
+            dict: the distance of each one of the found words
+        """
+        if max_distance is None:
+            max_distance = self.max_distance
+        if max_distance > self.max_distance:
+            raise ValueError("The index supports distances up to {}"
+                             .format(self.max_distance))
+
+        keys = numpy.array([crc32(d.encode("utf-8"))
+                            for d in deletes(word, max_distance)],
+                           dtype=numpy.uint32)
+        starts = numpy.searchsorted(self.hashes, keys, side="left")
+        ends = numpy.searchsorted(self.hashes, keys, side="right")
+
+        found = {}
+        for start, end in zip(starts.tolist(), ends.tolist()):
+            for i in self.ids[start:end].tolist():
+                candidate = self.word_at(i)
+                if candidate in found:
+                    continue
+                found[candidate] = damerau_levenshtein(word, candidate,
+                                                       max_distance)
+
+        return {w: d for w, d in found.items() if d <= max_distance}
+
+
+def source_signature(source):
+    """
+    The (size, modification time in ns) of a file, (0, 0) if no file
+    is given, or None if the file is missing.
+    """
+    if source is None:
+        return 0, 0
+    if not os.path.isfile(source):
+        return None
+    stat = os.stat(source)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def load_spell_index(corpus, words, max_distance=2):
+    """
+    Load the spell index of a corpus from ~/.ekphrasis/stats/<corpus>/,
+    building it from the vocabulary and saving it first, if it is missing
+    or outdated (not built from the current counts_1grams.txt).
+    If there is no counts_1grams.txt (e.g. only the json or the binary
+    statistics are available), a saved index cannot be checked against
+    the vocabulary, so the index is built in memory instead.
+
+    Args:
+        corpus (str): the name of the corpus
+        words (iterable): the vocabulary of the corpus
+        max_distance (int): the maximum edit distance of the lookups
+
+    Returns:
+        SymSpellIndex: the (memory-mapped) index
+    """
+    corpus_dir = path.join(get_stats_dir(), corpus)
+    filename = path.join(corpus_dir,
+                         "spellindex_d{}.bin".format(max_distance))
+    source = path.join(corpus_dir, "counts_1grams.txt")
+
+    if not os.path.isfile(source):
+        print("building spell index for {} (distance={}), without {}..."
+              .format(corpus, max_distance, source))
+        return SymSpellIndex.from_words(words, max_distance)
+
+    if os.path.isfile(filename):
+        index = SymSpellIndex.load(filename, source)
+        if index is not None:
+            return index
+
+    print("building spell index for {} (distance={})..."
+          .format(corpus, max_distance))
+    SymSpellIndex.from_words(words, max_distance).save(filename, source)
+    return SymSpellIndex.load(filename, source)
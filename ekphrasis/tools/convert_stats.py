@@ -0,0 +1,38 @@
+import argparse
+import glob
+import os
+import re
+
+from ekphrasis.classes.ngrams import convert_stats
+from ekphrasis.utils.helpers import get_stats_dir
+
+"""
+Convert the counts_{n}grams.txt files of one or more corpora to the binary
+format of NgramTable, which is memory-mapped on load (see ekphrasis.classes.ngrams).
+
+Example:
+    python convert_stats.py --corpus twitter_2018
+"""
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--corpus', nargs='*', default=None,
+                    help='the name(s) of the corpora to convert. '
+                         'If omitted, all the available corpora '
+                         'are converted.')
+parser.add_argument('--stats-dir', nargs='?', default=None,
+                    help='the directory with the statistics of the corpora. '
+                         'Defaults to ~/.ekphrasis/stats.')
+
+args = parser.parse_args()
+
+if __name__ == '__main__':
+    stats_dir = args.stats_dir or get_stats_dir()
+    corpora = args.corpus or sorted(d for d in os.listdir(stats_dir)
+                                    if os.path.isdir(os.path.join(stats_dir, d)))
+
+    for corpus in corpora:
+        pattern = os.path.join(stats_dir, corpus, "counts_*grams.txt")
+        for file in sorted(glob.glob(pattern)):
+            ngram = int(re.search(r"counts_(\d+)grams\.txt$", file).group(1))
+            print("converting {} - {}grams ...".format(corpus, ngram))
+            print("written to", convert_stats(corpus, ngram, stats_dir))
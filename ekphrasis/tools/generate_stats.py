@@ -1,20 +1,25 @@
 import argparse
-import glob
-import html
 import os
 import pickle
-import re
+import shutil
+import tempfile
 import time
-from collections import Counter
-from collections import defaultdict
+from array import array
+from itertools import islice
+from multiprocessing import Pool
 
 import matplotlib.pyplot as plt
 import numpy
+import ujson as json
 from tqdm import tqdm
 
-REGEX_TOKEN = re.compile(r'(?<![#@])\b[a-z]{1,15}\b')
-REGEX_URL = re.compile(
-    r"(https?:\/\/(?:www\.|(?!www))[^\s\.]+\.[^\s]{2,}|www\.[^\s]+\.[^\s]{2,})")
+from ekphrasis.classes.ngramcounter import (ApproxNgramCounter,
+                                            NgramCounter, file_ranges,
+                                            merge_shards, read_range,
+                                            shard_file)
+from ekphrasis.utils.readers import (corpus_files, is_compressed,
+                                     jsonl_texts, prefetch, read_lines)
+
 SEPARATOR = "_"
 
 
@@ -40,7 +45,16 @@ parser = argparse.ArgumentParser()
 # add arguments ########################################
 parser.add_argument('--input', nargs='?', type=check_empty_arg, default="./",
                     help='path to file or directory containing the files for '
-                         'calculating the statistics.')
+                         'calculating the statistics, or "-" for reading '
+                         'from the standard input. The files can be plain '
+                         'text (.txt) or JSONL (.jsonl) files, compressed '
+                         'or not (.gz, .bz2, .xz, .zst), which are '
+                         'decompressed while they are read.')
+parser.add_argument('--text-field', nargs='?', default=None,
+                    help='read the input as JSONL and count the text of this '
+                         'field of each object (e.g. "text" or '
+                         '"extended_tweet.full_text"). The .jsonl files are '
+                         'read from the "text" field by default.')
 parser.add_argument('--name', nargs='?', type=check_empty_arg,
                     default="mycorpus", help='')
 parser.add_argument('--ngrams', type=int, default=2,
@@ -56,122 +70,240 @@ pickle_parser.add_argument('--pickle', dest='pickle', action='store_true')
 pickle_parser.add_argument('--no-pickle', dest='pickle', action='store_false')
 parser.set_defaults(pickle=False)
 
+parser.add_argument('--chunk-size', type=int, default=100000,
+                    help='how many lines to tokenize and count at once. '
+                         'Larger chunks are faster, but need more memory.')
+
+parser.add_argument('--jobs', type=int, default=1,
+                    help='count the input in parallel, with the given number '
+                         'of worker processes. Each worker counts a part of '
+                         'the input (see --split-size) and writes its counts '
+                         'to a shard, and the shards are then merged.')
+parser.add_argument('--split-size', type=int, default=256,
+                    help='(parallel mode) split the input files into parts '
+                         'of about this many MB.')
+parser.add_argument('--save-shard', nargs='?', default=None,
+                    help='(parallel mode) write all the merged counts, '
+                         'before any pruning, to this directory, as a shard '
+                         'that can be merged later, using --merge.')
+parser.add_argument('--merge', nargs='+', default=[],
+                    help='(parallel mode) shard directories with existing '
+                         'counts (see --save-shard), to merge with the counts '
+                         'of the input, e.g. for adding the data of a new day '
+                         'to the statistics without counting everything '
+                         'again. Implies the parallel mode.')
+
+parser.add_argument('--memory', type=int, default=None,
+                    help='count approximately, within this memory budget '
+                         '(in MB), keeping only the most frequent ngrams. '
+                         'The error bounds of the counts are written to a '
+                         'counts_{n}grams.txt.meta file, next to the counts. '
+                         'Not compatible with the parallel mode.')
+
 web_parser = parser.add_mutually_exclusive_group()
 web_parser.add_argument('--web-fix', dest='web_fix', action='store_true')
 web_parser.add_argument('--no-web-fix', dest='web_fix', action='store_false')
 parser.set_defaults(web_fix=True)
 
 args = parser.parse_args()
+if args.memory is not None and (args.jobs > 1 or args.merge):
+    parser.error("--memory is not compatible with --jobs and --merge")
+if args.input == "-" and (args.jobs > 1 or args.merge):
+    parser.error("the standard input can't be counted in parallel")
 
 
 ###############################################################################
 
-def tokenize(text):
-    """
-    extract words from text
-    :param text:
-    :return:
-    """
-    if args.web_fix:
-        text = REGEX_URL.sub(' ', text)
-        text = html.unescape(text)
-    return REGEX_TOKEN.findall(text.lower())
-
-
-def get_ngrams(input_list, n):
-    return zip(*[input_list[i:] for i in range(n)])
-
-
-def write_stats_to_file(file, counts, mincount):
+def write_stats_to_file(file, counter, ngram, mincount):
     with open(file, 'w', encoding="utf-8") as f:
         if args.perc == 0:
             percentile = 0
         else:
-            percentile = numpy.percentile(
-                numpy.fromiter(counts.values(), numpy.int32), args.perc)
+            percentile = numpy.percentile(counter.get_counts(ngram), args.perc)
         threshold = max(percentile, mincount)
 
-        for k, v in counts.items():
-
-            if v >= threshold:
-                entry = k.split(SEPARATOR)
-                entry.append(str(v))
-                f.write('\t'.join(entry) + '\n')
+        for tokens, count in counter.items(ngram, threshold):
+            f.write('\t'.join(tokens) + '\t' + str(count) + '\n')
 
     if args.pickle:
         with open(file + ".pickle", 'wb') as f:
-            pickle.dump(counts, f)
+            pickle.dump({SEPARATOR.join(tokens): count
+                         for tokens, count in counter.items(ngram)}, f)
+
+
+def read_chunks(infile, size):
+    while True:
+        chunk = list(islice(infile, size))
+        if not chunk:
+            break
+        yield chunk
+
 
+def text_field(filename):
+    if args.text_field or ".jsonl" not in os.path.basename(filename):
+        return args.text_field
+    return "text"
 
-def count_file(filename, countkeeper, desc=""):
+
+def count_file(filename, counter, desc=""):
     """
-    Count the word statistics of a file
+    Count the word statistics of a file. The file is read and decompressed
+    in a separate thread, while the previous chunks are counted.
     :param desc:
-    :param filename:
-    :param countkeeper:
+    :param filename: the file, or "-" for the standard input
+    :param counter: the NgramCounter
     :return:
     """
     print()
     print("computing statistics for file: ", filename)
-    with open(filename, "r", encoding="utf-8", errors='ignore') as infile:
-        num_lines = sum(1 for line in open(filename, "r", encoding="utf-8"))
-        for line in tqdm(infile, total=num_lines, desc=desc):
-            try:
-                toks = tokenize(line)
-                for i in range(args.ngrams):
-                    ngram = i + 1
-                    if ngram > 1:
-                        toks = ["<S>"] + toks
-                    for token in get_ngrams(toks, ngram):
-                        countkeeper[ngram][SEPARATOR.join(token)] += 1
-            except Exception as e:
-                print("ERROR - ", e, infile)
+    lines = read_lines(filename, text_field(filename))
+    with tqdm(desc=desc, unit=" lines") as progress:
+        for chunk in prefetch(read_chunks(lines, args.chunk_size)):
+            counter.add_lines(chunk)
+            progress.update(len(chunk))
 
 
-def write_stats(counts):
-    print()
+def stats_filename(ngram):
     dir_path = os.path.dirname(os.path.realpath(__file__))
-    for k, v in counts.items():
+    name = "counts_{}grams.txt".format(str(ngram))
+    return os.path.join(dir_path, "..", "stats", args.name, name)
+
+
+def write_stats(counter):
+    print()
+    for k in counter.ngrams:
         print("Writing " + str(k) + "-grams...")
-        counter = Counter(counts[k])
-        print("entries:{}\t-\ttokens:{}".format(format(len(counter), ','),
-                                                format(sum(counter.values()),
+        counts = counter.get_counts(k)
+        print("entries:{}\t-\ttokens:{}".format(format(len(counts), ','),
+                                                format(int(counts.sum()),
                                                        ',')))
 
-        name = "counts_{}grams.txt".format(str(k))
-        filename = os.path.join(dir_path, "..", "stats", args.name, name)
+        filename = stats_filename(k)
 
         print("writing stats to file {}".format(filename))
         os.makedirs(os.path.dirname(filename), exist_ok=True)
 
-        write_stats_to_file(filename, counter, args.mincount[int(k) - 1])
+        write_stats_to_file(filename, counter, k, args.mincount[int(k) - 1])
 
+        if isinstance(counter, ApproxNgramCounter):
+            bounds = counter.error_bounds(k)
+            print("max error:{}\t-\tall the entries above:{}".format(
+                format(int(bounds["max_error"]), ','),
+                format(bounds["min_count"], ',')))
+            with open(filename + ".meta", 'w', encoding="utf-8") as f:
+                json.dump(bounds, f, indent=4)
 
-def prune_low_freq(word_stats, threshold):
+
+def count_shard(task):
+    """
+    Count a byte range of a file and write the counts to a shard
+    (runs in a worker process).
+    :param task: (the file, the start and the end of the range,
+        the directory of the shard). The compressed files can't be split,
+        so they are counted as a whole (with start and end set to None).
+    :return: the directory of the shard
     """
-    remove ngrams with count less than mincount
-    avoid dict comprehension as it creates a new temp dict
-    and overloads the memory
-    Args:
-        word_stats ():
-        threshold ():
+    filename, start, end, path = task
+    counter = NgramCounter(args.ngrams, web_fix=args.web_fix)
+    if start is None:
+        lines = read_lines(filename, text_field(filename))
+    else:
+        lines = read_range(filename, start, end)
+        if text_field(filename):
+            lines = jsonl_texts(lines, text_field(filename))
+    for chunk in prefetch(read_chunks(lines, args.chunk_size)):
+        counter.add_lines(chunk)
+    counter.write_shard(path)
+    return path
 
-    Returns:
 
+def write_merged_stats(shards, ngram, mincount):
+    """
+    Merge the counts of the shards and write the ones above the thresholds.
+    The merged counts are first written to a (temporary) shard, because
+    the percentile threshold is known only after all of them are merged.
     """
-    for ng in list(word_stats.keys()):
-        for t in list(word_stats[ng].keys()):
-            if not word_stats[ng][t] >= threshold:
-                del word_stats[ng][t]
+    filename = stats_filename(ngram)
+    merged = filename + ".merged"
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+
+    counts = array("q")
+    with open(merged, 'w', encoding="utf-8") as f:
+        for key, count in merge_shards(shards, ngram):
+            f.write(key + '\t' + str(count) + '\n')
+            counts.append(count)
+    counts = numpy.frombuffer(counts, numpy.int64) if counts else \
+        numpy.zeros(0, numpy.int64)
+    print("entries:{}\t-\ttokens:{}".format(format(len(counts), ','),
+                                            format(int(counts.sum()), ',')))
+
+    if args.perc == 0 or len(counts) == 0:
+        percentile = 0
+    else:
+        percentile = numpy.percentile(counts, args.perc)
+    threshold = max(percentile, mincount)
 
+    print("writing stats to file {}".format(filename))
+    with open(merged, 'r', encoding="utf-8") as infile, \
+            open(filename, 'w', encoding="utf-8") as f:
+        for line, count in zip(infile, counts.tolist()):
+            if count >= threshold:
+                f.write(line)
 
-def plot_statistics(statistics):
-    fig = plt.figure(figsize=(5 * len(statistics), 5))
-    for i, (k, v) in enumerate(statistics.items()):
-        ax = fig.add_subplot(1, len(statistics), i + 1)
-        ax.set_title("{}-gram - total={}".format(k, len(v)))
+    if args.pickle:
+        with open(merged, 'r', encoding="utf-8") as infile, \
+                open(filename + ".pickle", 'wb') as f:
+            pickle.dump({SEPARATOR.join(line.split('\t')[:-1]): count
+                         for line, count in zip(infile, counts.tolist())}, f)
+
+    if args.save_shard:
+        os.makedirs(args.save_shard, exist_ok=True)
+        shutil.move(merged, shard_file(args.save_shard, ngram))
+    else:
+        os.remove(merged)
+
+
+def count_parallel(files):
+    """
+    Count the files with a pool of workers, each one writing the counts
+    of a part of a file to a shard, and then merge all the shards,
+    along with any existing ones (--merge).
+    """
+    stats_dir = os.path.dirname(stats_filename(1))
+    os.makedirs(stats_dir, exist_ok=True)
+
+    # the shards are written next to the statistics, instead of /tmp,
+    # as they can be as large as them
+    with tempfile.TemporaryDirectory(dir=stats_dir) as tmp:
+        tasks = []
+        for file in files:
+            if is_compressed(file):
+                ranges = [(None, None)]
+            else:
+                ranges = file_ranges(file, args.split_size * 2 ** 20)
+            for start, end in ranges:
+                path = os.path.join(tmp, "part-{}".format(len(tasks)))
+                tasks.append((file, start, end, path))
+
+        with Pool(args.jobs) as pool:
+            shards = list(tqdm(pool.imap_unordered(count_shard, tasks),
+                               total=len(tasks), desc="counting",
+                               unit=" parts"))
+
+        print()
+        for k in range(1, args.ngrams + 1):
+            print("Merging " + str(k) + "-grams...")
+            write_merged_stats(shards + args.merge, k,
+                               args.mincount[int(k) - 1])
+
+
+def plot_statistics(counter):
+    fig = plt.figure(figsize=(5 * counter.order, 5))
+    for i, k in enumerate(counter.ngrams):
+        values = counter.get_counts(k)
+        ax = fig.add_subplot(1, counter.order, i + 1)
+        ax.set_title("{}-gram - total={}".format(k, len(values)))
         ax.grid(True)
-        values = numpy.fromiter(statistics[k].values(), numpy.int32)
         ax.hist(values, bins=100, range=(0, 100))
     fig.tight_layout()
     fig.canvas.draw()
@@ -180,18 +312,29 @@ def plot_statistics(statistics):
 
 if __name__ == '__main__':
     plt.ion()  # set plot to animated
-    stats = defaultdict(lambda: defaultdict(int))
+    if args.memory is not None:
+        stats = ApproxNgramCounter(args.ngrams, web_fix=args.web_fix,
+                                   memory=args.memory)
+    else:
+        stats = NgramCounter(args.ngrams, web_fix=args.web_fix)
     pruning_size_threshold = 5000000
     low_freq_threshold = 3
 
-    if os.path.isfile(args.input):
+    if args.jobs > 1 or args.merge:
+        if os.path.isfile(args.input):
+            count_parallel([args.input])
+        elif os.path.isdir(args.input):
+            count_parallel(corpus_files(args.input))
+        else:
+            print("Wrong input. Give a file or directory!")
+
+    elif args.input == "-" or os.path.isfile(args.input):
         count_file(args.input, stats)
         time.sleep(0.01)
-        prune_low_freq(stats, 1)
         write_stats(stats)
 
     elif os.path.isdir(args.input):
-        files = glob.glob(args.input + "*.txt")
+        files = corpus_files(args.input)
         for i, file in enumerate(files):
             try:
                 count_file(file, stats, str(i + 1) + "/" + str(len(files)))
@@ -200,17 +343,19 @@ if __name__ == '__main__':
 
             time.sleep(0.01)
 
-            if any(len(stats[ngram]) > pruning_size_threshold for ngram in
-                   list(stats.keys())):
+            if args.memory is None and any(
+                    stats.size(ngram) > pruning_size_threshold
+                    for ngram in stats.ngrams):
                 print("Cleaning entries with only one occurrence, "
                       "in order to save memory...")
-                prune_low_freq(stats, low_freq_threshold)
+                stats.prune(low_freq_threshold)
                 # write progress
                 # plot_statistics(stats)
 
             write_stats(stats)
 
-        prune_low_freq(stats, low_freq_threshold)
+        if args.memory is None:
+            stats.prune(low_freq_threshold)
         write_stats(stats)
     else:
         print("Wrong input. Give a file or directory!")
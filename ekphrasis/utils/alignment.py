@@ -0,0 +1,131 @@
+import html
+import re
+
+# the character references that html.unescape replaces
+CHARREF = re.compile(r'&(#[0-9]+;?|#[xX][0-9a-fA-F]+;?|[^\t\n\f <&#;]{1,32};?)')
+
+
+class AlignedText:
+    """
+    A string that was derived from a source text by a series of
+    substitutions, which keeps the span of the source text that each one
+    of its characters comes from. The characters of a replacement are
+    aligned to the whole span of the text that they replaced,
+    e.g. "&amp;" -> "&" or "sooo" -> " so <elongated> ".
+
+    Used for mapping the tokens of the pre-processed text back to the
+    character offsets of the original text.
+    """
+
+    def __init__(self, text, starts=None, ends=None, length=None):
+        """
+        Args:
+            text (str): the (derived) text
+            starts (list): the start offset in the source, for each character
+            ends (list): the end offset in the source, for each character
+            length (int): the length of the source
+        """
+        self.text = text
+        self.starts = starts if starts is not None else list(range(len(text)))
+        self.ends = ends if ends is not None else list(range(1, len(text) + 1))
+        self.length = length if length is not None else len(text)
+
+    def position(self, i):
+        """
+        The offset in the source, of the (zero-width) position i.
+        """
+        if i < len(self.text):
+            return self.starts[i]
+        return self.ends[-1] if self.ends else self.length
+
+    def span(self, start, end):
+        """
+        The span in the source of the characters text[start:end].
+        """
+        if start < end:
+            return self.starts[start], self.ends[end - 1]
+        position = self.position(start)
+        return position, position
+
+    def sub(self, regex, repl):
+        """
+        Like regex.sub(repl, text), keeping the alignment.
+
+        Args:
+            regex: a compiled regex
+            repl (str or callable): the replacement template
+                or a function of the match
+
+        Returns:
+            AlignedText: the new text
+        """
+        return self.replace_spans(
+            (m.start(), m.end(),
+             m.expand(repl) if isinstance(repl, str) else repl(m))
+            for m in regex.finditer(self.text))
+
+    def replace_spans(self, replacements):
+        """
+        Replace the given spans of the text, keeping the alignment.
+
+        Args:
+            replacements (iterable): (start, end, replacement) tuples,
+                of non-overlapping spans, in the order of the text
+
+        Returns:
+            AlignedText: the new text
+        """
+        text = []
+        starts = []
+        ends = []
+        last = 0
+        for s, e, replacement in replacements:
+            text.append(self.text[last:s])
+            starts.extend(self.starts[last:s])
+            ends.extend(self.ends[last:s])
+
+            if replacement:
+                start, end = self.span(s, e)
+                text.append(replacement)
+                starts.extend([start] * len(replacement))
+                ends.extend([end] * len(replacement))
+            last = e
+
+        text.append(self.text[last:])
+        starts.extend(self.starts[last:])
+        ends.extend(self.ends[last:])
+        return AlignedText("".join(text), starts, ends, self.length)
+
+    def unescape_html(self):
+        """
+        Like html.unescape, keeping the alignment.
+        """
+        if "&" not in self.text:
+            return self
+        return self.replace_spans(unescaped_spans(self.text))
+
+    def __str__(self):
+        return self.text
+
+    def __len__(self):
+        return len(self.text)
+
+
+def unescaped_spans(text):
+    """
+    The (start, end, replacement) of the character references of a text,
+    which html.unescape replaces. Only the replaced part of each reference
+    is reported, since a name without ";" is replaced only up to its
+    longest known prefix, or not at all (e.g. "&ampx" -> "&x", "&x" -> "&x").
+    """
+    for m in CHARREF.finditer(text):
+        ref = m.group()
+        replacement = html.unescape(ref)
+        # the tail of the reference that is kept as it is
+        kept = 0
+        while kept < len(replacement) and \
+                ref[-1 - kept] == replacement[-1 - kept]:
+            kept += 1
+        if kept < len(ref):
+            yield (m.start(), m.end() - kept,
+                   replacement[:len(replacement) - kept])
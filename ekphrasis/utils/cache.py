@@ -0,0 +1,194 @@
+import threading
+from collections import OrderedDict, defaultdict, namedtuple
+
+import ujson as json
+
+CacheInfo = namedtuple("CacheInfo", ["hits", "misses", "maxsize", "currsize"])
+
+
+class LRUCache:
+    """
+    A bounded, least-recently-used cache, which keeps hit/miss statistics
+    (like functools.lru_cache). Unlike lru_cache on a method, each instance
+    has its own cache, keyed on plain values (e.g. the matched text),
+    so it does not keep alive the objects that use it.
+
+    It is safe to share between threads: each operation on the
+    underlying OrderedDict is atomic, and a key that is evicted by another
+    thread between the lookup and the update is counted as a miss.
+    """
+
+    def __init__(self, maxsize=65536):
+        """
+        Args:
+            maxsize (int): the maximum number of entries.
+                If None, the cache is unbounded.
+        """
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.data = OrderedDict()
+
+    def get(self, key, default=None):
+        try:
+            value = self.data[key]
+            self.data.move_to_end(key)
+        except KeyError:
+            self.misses += 1
+            return default
+
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        try:
+            self.data[key] = value
+            self.data.move_to_end(key)
+            if self.maxsize is not None and len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+        except KeyError:
+            # evicted (or the cache emptied) by another thread
+            pass
+
+    def get_or_compute(self, key, func, *args):
+        """
+        Return the cached value of `key`, or compute it with func(*args)
+        and cache it.
+        """
+        value = self.get(key, _missing)
+        if value is _missing:
+            value = func(*args)
+            self.put(key, value)
+        return value
+
+    def items(self):
+        """
+        The cached (key, value) pairs, from the least to the most
+        recently used.
+        """
+        return list(self.data.items())
+
+    def info(self):
+        return CacheInfo(self.hits, self.misses, self.maxsize, len(self.data))
+
+    def clear(self):
+        self.data.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def save(self, filename):
+        """
+        Write the cached entries to a json file. Only for caches with
+        string keys and json serializable values.
+        """
+        with open(filename, "w") as f:
+            json.dump(self.items(), f)
+
+    def load(self, filename):
+        """
+        Warm the cache with the entries of a file written by `save`.
+        """
+        with open(filename, "r") as f:
+            for key, value in json.load(f):
+                self.put(key, value)
+
+    def __contains__(self, key):
+        return key in self.data
+
+    def __len__(self):
+        return len(self.data)
+
+
+class LFUCache(LRUCache):
+    """
+    A bounded, least-frequently-used cache. When full, it evicts the entry
+    with the fewest hits (the least recently used one among ties).
+    Suitable for very skewed distributions (e.g. hashtags), in which
+    the popular entries should survive bursts of rare ones.
+
+    The frequencies are kept in several structures, which are updated
+    under a lock, so that it is also safe to share between threads.
+    """
+
+    def __init__(self, maxsize=65536):
+        super().__init__(maxsize)
+        self.freqs = {}
+        # the keys with the same frequency, in LRU order
+        self.buckets = defaultdict(OrderedDict)
+        self.min_freq = 0
+        self.lock = threading.Lock()
+
+    def _touch(self, key):
+        freq = self.freqs[key]
+        del self.buckets[freq][key]
+        if not self.buckets[freq]:
+            del self.buckets[freq]
+            if self.min_freq == freq:
+                self.min_freq = freq + 1
+        self.freqs[key] = freq + 1
+        self.buckets[freq + 1][key] = None
+
+    def get(self, key, default=None):
+        with self.lock:
+            try:
+                value = self.data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+
+            self.hits += 1
+            self._touch(key)
+            return value
+
+    def put(self, key, value):
+        with self.lock:
+            if key in self.data:
+                self.data[key] = value
+                self._touch(key)
+                return
+
+            if self.maxsize == 0:
+                return
+
+            if self.maxsize is not None and len(self.data) >= self.maxsize:
+                evicted, _ = self.buckets[self.min_freq].popitem(last=False)
+                if not self.buckets[self.min_freq]:
+                    del self.buckets[self.min_freq]
+                del self.data[evicted]
+                del self.freqs[evicted]
+
+            self.data[key] = value
+            self.freqs[key] = 1
+            self.buckets[1][key] = None
+            self.min_freq = 1
+
+    def items(self):
+        """
+        The cached (key, value) pairs, from the least to the most
+        frequently used.
+        """
+        with self.lock:
+            return [(key, self.data[key]) for freq in sorted(self.buckets)
+                    for key in self.buckets[freq]]
+
+    def clear(self):
+        with self.lock:
+            super().clear()
+            self.freqs.clear()
+            self.buckets.clear()
+            self.min_freq = 0
+
+
+def make_cache(maxsize=65536, policy="lru"):
+    """
+    Create a cache with the given eviction policy ("lru" or "lfu").
+    """
+    if policy == "lru":
+        return LRUCache(maxsize)
+    elif policy == "lfu":
+        return LFUCache(maxsize)
+    else:
+        raise ValueError("Unknown cache policy: {}".format(policy))
+
+
+_missing = object()
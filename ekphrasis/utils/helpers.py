@@ -1,3 +1,4 @@
+from contextlib import contextmanager
 from functools import reduce
 import operator
 import os
@@ -6,6 +7,7 @@ from os.path import expanduser
 import sys
 import ujson as json
 from urllib.request import urlretrieve
+import uuid
 import zipfile
 
 
@@ -97,6 +99,41 @@ def product(nums):
     """
     return reduce(operator.mul, nums, 1)
 
+
+def chunks(iterable, size):
+    """
+    Split an iterable to lists of (at most) `size` items.
+    """
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+@contextmanager
+def open_atomic(filename):
+    """
+    Open a file for writing (binary), through a temporary file in the same
+    directory, which replaces the file only after it is completely written.
+    The readers of the file (e.g. the processes that memory-map it) never
+    see it partially written, and if the writing fails, the previous
+    version of the file is kept.
+    """
+    temp = "{}.{}.tmp".format(filename, uuid.uuid4().hex)
+    try:
+        with open(temp, "xb") as f:
+            yield f
+        os.replace(temp, filename)
+    except BaseException:
+        if os.path.exists(temp):
+            os.remove(temp)
+        raise
+
+
 def remove_tags(doc):
     """
     Remove tags from sentence
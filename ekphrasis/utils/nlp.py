@@ -20,6 +20,25 @@ contrast_words = {"but", "although", "though", "however", "despite", "whereas",
                   "while", "unlike", "still"}
 neg_puncts = {"\n", ".", "?", ":", "..."}
 
+# (regex, replacement template) pairs of unpack_contractions, in order
+CONTRACTIONS = [(re.compile(regex), template) for regex, template in [
+    # standard
+    (r"(\b)([Aa]re|[Cc]ould|[Dd]id|[Dd]oes|[Dd]o|[Hh]ad|[Hh]as|[Hh]ave|[Ii]s|[Mm]ight|[Mm]ust|[Ss]hould|[Ww]ere|[Ww]ould)n['’]t",
+     r"\1\2 not"),
+    (r"(\b)([Hh]e|[Ii]|[Ss]he|[Tt]hey|[Ww]e|[Ww]hat|[Ww]ho|[Yy]ou)['’]ll",
+     r"\1\2 will"),
+    (r"(\b)([Tt]hey|[Ww]e|[Ww]hat|[Ww]ho|[Yy]ou)['’]re", r"\1\2 are"),
+    (r"(\b)([Ii]|[Ss]hould|[Tt]hey|[Ww]e|[Ww]hat|[Ww]ho|[Ww]ould|[Yy]ou)['’]ve",
+     r"\1\2 have"),
+    # non-standard
+    (r"(\b)([Cc]a)n['’]t", r"\1\2n not"),
+    (r"(\b)([Ii])['’]m", r"\1\2 am"),
+    (r"(\b)([Ll]et)['’]s", r"\1\2 us"),
+    (r"(\b)([Ww])on['’]t", r"\1\2ill not"),
+    (r"(\b)([Ss])han['’]t", r"\1\2hall not"),
+    (r"(\b)([Yy])(?:['’]all|a['’]ll)", r"\1\2ou all"),
+]]
+
 
 def unpack_contractions(text):
     """
@@ -40,25 +59,8 @@ def unpack_contractions(text):
     in order to just use this function.
 
     """
-    # standard
-    text = re.sub(
-        r"(\b)([Aa]re|[Cc]ould|[Dd]id|[Dd]oes|[Dd]o|[Hh]ad|[Hh]as|[Hh]ave|[Ii]s|[Mm]ight|[Mm]ust|[Ss]hould|[Ww]ere|[Ww]ould)n['’]t",
-        r"\1\2 not", text)
-    text = re.sub(
-        r"(\b)([Hh]e|[Ii]|[Ss]he|[Tt]hey|[Ww]e|[Ww]hat|[Ww]ho|[Yy]ou)['’]ll",
-        r"\1\2 will", text)
-    text = re.sub(r"(\b)([Tt]hey|[Ww]e|[Ww]hat|[Ww]ho|[Yy]ou)['’]re", r"\1\2 are",
-                  text)
-    text = re.sub(
-        r"(\b)([Ii]|[Ss]hould|[Tt]hey|[Ww]e|[Ww]hat|[Ww]ho|[Ww]ould|[Yy]ou)['’]ve",
-        r"\1\2 have", text)
-    # non-standard
-    text = re.sub(r"(\b)([Cc]a)n['’]t", r"\1\2n not", text)
-    text = re.sub(r"(\b)([Ii])['’]m", r"\1\2 am", text)
-    text = re.sub(r"(\b)([Ll]et)['’]s", r"\1\2 us", text)
-    text = re.sub(r"(\b)([Ww])on['’]t", r"\1\2ill not", text)
-    text = re.sub(r"(\b)([Ss])han['’]t", r"\1\2hall not", text)
-    text = re.sub(r"(\b)([Yy])(?:['’]all|a['’]ll)", r"\1\2ou all", text)
+    for regex, template in CONTRACTIONS:
+        text = regex.sub(template, text)
     return text
 
 
@@ -0,0 +1,136 @@
+import re
+
+try:
+    from re import _parser as sre_parse
+except ImportError:  # python < 3.11
+    import sre_parse
+
+"""
+Static analysis of regular expressions, for finding the characters with
+which a match of an expression can start (its FIRST set).
+
+A tokenizer can use the FIRST sets of the expressions of its pipeline, in
+order to try at each position only the expressions that can match there,
+instead of all of them (see PrefilterScanner). The FIRST sets are
+conservative: any construct that is not understood (or is zero-width,
+like lookarounds and anchors) only makes the set larger, so an expression
+is never excluded from a position in which it could match.
+"""
+
+_c = sre_parse
+
+CATEGORIES = {
+    _c.CATEGORY_DIGIT: re.compile(r"\d"),
+    _c.CATEGORY_NOT_DIGIT: re.compile(r"\D"),
+    _c.CATEGORY_SPACE: re.compile(r"\s"),
+    _c.CATEGORY_NOT_SPACE: re.compile(r"\S"),
+    _c.CATEGORY_WORD: re.compile(r"\w"),
+    _c.CATEGORY_NOT_WORD: re.compile(r"\W"),
+}
+
+REPEATS = {_c.MAX_REPEAT, _c.MIN_REPEAT}
+for _name in ("POSSESSIVE_REPEAT",):
+    if hasattr(_c, _name):
+        REPEATS.add(getattr(_c, _name))
+
+ZERO_WIDTH = {_c.AT, _c.ASSERT, _c.ASSERT_NOT}
+
+ANY = ("any",)
+
+
+def _first(items):
+    """
+    The (tests, nullable) of a sequence of parsed items, where tests are the
+    tests of a character that can start a match and nullable is True
+    if the sequence can match the empty string.
+    """
+    tests = []
+    for op, av in items:
+        item_tests, nullable = _first_item(op, av)
+        tests.extend(item_tests)
+        if not nullable:
+            return tests, False
+    return tests, True
+
+
+def _first_item(op, av):
+    if op is _c.LITERAL:
+        return [("lit", av)], False
+    if op is _c.NOT_LITERAL:
+        return [("notlit", av)], False
+    if op is _c.ANY:
+        return [ANY], False
+    if op is _c.IN:
+        return [("in", av)], False
+    if op is _c.SUBPATTERN:
+        group, add_flags, del_flags, pattern = av
+        if add_flags & re.IGNORECASE:
+            return [ANY], True
+        return _first(pattern)
+    if op is _c.BRANCH:
+        tests = []
+        nullable = False
+        for branch in av[1]:
+            branch_tests, branch_nullable = _first(branch)
+            tests.extend(branch_tests)
+            nullable = nullable or branch_nullable
+        return tests, nullable
+    if op in REPEATS:
+        low, high, pattern = av
+        tests, nullable = _first(pattern)
+        return tests, nullable or low == 0
+    if getattr(_c, "ATOMIC_GROUP", None) is op:
+        return _first(av)
+    if op in ZERO_WIDTH:
+        return [], True
+    # backreferences, conditionals and anything else
+    return [ANY], True
+
+
+def _accepts_set(items, c, code):
+    negate = False
+    matched = False
+    for op, av in items:
+        if op is _c.NEGATE:
+            negate = True
+        elif op is _c.LITERAL:
+            matched = matched or code == av
+        elif op is _c.RANGE:
+            matched = matched or av[0] <= code <= av[1]
+        elif op is _c.CATEGORY and av in CATEGORIES:
+            matched = matched or CATEGORIES[av].match(c) is not None
+        else:
+            return True
+    return matched != negate
+
+
+def _accepts(test, c):
+    code = ord(c)
+    if test is ANY:
+        return True
+    kind, av = test
+    if kind == "lit":
+        return code == av
+    if kind == "notlit":
+        return code != av
+    return _accepts_set(av, c, code)
+
+
+class FirstSet:
+    """
+    The characters with which a match of an expression can start.
+    """
+
+    def __init__(self, pattern, flags=0):
+        parsed = sre_parse.parse(pattern, flags)
+        if parsed.state.flags & re.IGNORECASE:
+            self.tests, self.nullable = [ANY], True
+        else:
+            self.tests, self.nullable = _first(parsed)
+
+    def __contains__(self, c):
+        """
+        Check if a match can start with the character c.
+        An expression that can match the empty string can start anywhere.
+        """
+        return self.nullable or any(_accepts(t, c) for t in self.tests)
@@ -0,0 +1,158 @@
+"""
+Streaming readers for the text corpora, for counting their statistics
+(see tools/generate_stats.py) without decompressing them to disk first.
+
+Supported inputs:
+    * plain text files (one document per line)
+    * compressed files: .gz, .bz2, .xz and .zst (zstd requires the
+        `zstandard` package (pip install zstandard), or python >= 3.14)
+    * JSONL files (.jsonl, one json object per line), from which the text
+        of each document is read from a given field
+    * the standard input ("-")
+
+The decompression (and the parsing of the json) can run in a separate
+thread (see `prefetch`), overlapping with the processing of the lines.
+zlib, bz2 and lzma release the GIL while decompressing.
+"""
+
+import bz2
+import glob
+import gzip
+import io
+import lzma
+import queue
+import sys
+import threading
+
+import ujson as json
+
+COMPRESSIONS = (".gz", ".bz2", ".xz", ".zst")
+
+
+def open_zstd(filename):
+    try:
+        from compression import zstd  # python >= 3.14
+        return zstd.open(filename, "rb")
+    except ImportError:
+        pass
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError("Reading .zst files requires the zstandard "
+                          "package. Run: pip install zstandard")
+    return zstandard.ZstdDecompressor().stream_reader(open(filename, "rb"),
+                                                      closefd=True)
+
+
+def open_binary(filename):
+    """
+    Open a (possibly compressed) file, or the standard input ("-"),
+    for reading its decompressed bytes.
+    """
+    if filename == "-":
+        return sys.stdin.buffer
+    if filename.endswith(".gz"):
+        return gzip.open(filename, "rb")
+    if filename.endswith(".bz2"):
+        return bz2.open(filename, "rb")
+    if filename.endswith(".xz"):
+        return lzma.open(filename, "rb")
+    if filename.endswith(".zst"):
+        return open_zstd(filename)
+    return open(filename, "rb")
+
+
+def is_compressed(filename):
+    return filename.endswith(COMPRESSIONS)
+
+
+def open_text(filename):
+    """
+    Open a (possibly compressed) text file, or the standard input ("-"),
+    like `open(filename, "r", encoding="utf-8", errors="ignore")`.
+    """
+    return io.TextIOWrapper(open_binary(filename), encoding="utf-8",
+                            errors="ignore")
+
+
+def get_field(obj, field):
+    """
+    Get the value of a (nested) field of a json object,
+    e.g. "text" or "extended_tweet.full_text".
+    """
+    for key in field.split("."):
+        if not isinstance(obj, dict):
+            return None
+        obj = obj.get(key)
+    return obj
+
+
+def jsonl_texts(lines, field):
+    """
+    Read the texts of a field from JSONL lines. The lines that are not valid
+    json, or do not contain the field, are skipped. The line breaks of the
+    texts are replaced with spaces, so that each text is a single line.
+    """
+    for line in lines:
+        try:
+            text = get_field(json.loads(line), field)
+        except ValueError:
+            continue
+        if isinstance(text, str):
+            yield " ".join(text.splitlines()) + "\n"
+
+
+def read_lines(filename, text_field=None):
+    """
+    Iterate over the lines (documents) of a corpus file.
+
+    Args:
+        filename (str): the path of the (possibly compressed) file,
+            or "-" for the standard input
+        text_field (str): read the file as JSONL and get the text
+            of each document from this field
+    """
+    with open_text(filename) as f:
+        if text_field:
+            yield from jsonl_texts(f, text_field)
+        else:
+            yield from f
+
+
+def prefetch(iterable, size=4):
+    """
+    Iterate over an iterable in a separate (daemon) thread,
+    keeping up to `size` of its items ready in a queue.
+    The exceptions of the thread are raised in the caller.
+    """
+    items = queue.Queue(size)
+    end = object()
+
+    def produce():
+        try:
+            for item in iterable:
+                items.put(item)
+        except BaseException as e:
+            items.put(e)
+        items.put(end)
+
+    threading.Thread(target=produce, daemon=True).start()
+    while True:
+        item = items.get()
+        if item is end:
+            return
+        if isinstance(item, BaseException):
+            raise item
+        yield item
+
+
+def corpus_files(prefix):
+    """
+    The corpus files that start with a prefix (e.g. a directory): the plain
+    text (.txt) and the JSONL (.jsonl) files, compressed or not.
+    """
+    files = []
+    for extension in (".txt", ".jsonl"):
+        for compression in ("",) + COMPRESSIONS:
+            files.extend(glob.glob(prefix + "*" + extension + compression))
+    return sorted(files)
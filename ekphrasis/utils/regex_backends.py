@@ -0,0 +1,225 @@
+import re
+import sys
+from functools import lru_cache
+
+try:
+    from re import _parser as sre_parse
+except ImportError:  # python < 3.11
+    import sre_parse
+
+"""
+Pluggable regex engines for the expressions of ekphrasis.
+
+Supported backends:
+    * "re": the standard library (the reference behavior)
+    * "regex": the `regex` package (pip install regex), in its
+        re-compatible (V0) mode
+    * "re2": Google's RE2 (pip install google-re2), a linear-time engine
+        without backtracking, which does not support lookarounds,
+        backreferences and Unicode word boundaries
+
+The backends are optional. An expression is compiled with the requested
+backend only if it is compatible with it, meaning that it matches exactly
+the same strings as with `re`, and otherwise it falls back to `re`.
+The Unicode classes (\\w, \\d, \\s and their negations) and the word boundaries
+match different characters in each engine, e.g. \\w matches the combining
+marks in regex, but not in re. For RE2, the classes are rewritten to explicit
+character sets, which are generated from `re` itself. For regex, the same
+rewrite would be exact, but it makes the expressions many times slower than
+with re, so the expressions that use them are not compatible with regex.
+"""
+
+BACKENDS = ("re", "regex", "re2")
+
+
+class IncompatibleExpression(ValueError):
+    pass
+
+
+def load_backend(name):
+    """
+    Import the module of a backend.
+
+    Returns:
+        the module, or None if it is not installed
+    """
+    if name not in BACKENDS:
+        raise ValueError("Unknown regex backend: {}".format(name))
+    try:
+        if name == "regex":
+            import regex
+            return regex
+        elif name == "re2":
+            import re2
+            return re2
+        return re
+    except ImportError:
+        return None
+
+
+def available_backends():
+    return [name for name in BACKENDS if load_backend(name) is not None]
+
+
+@lru_cache(maxsize=None)
+def unicode_class(escape):
+    """
+    The explicit ranges (for use within a character set) of the code points
+    that are matched by a class escape of `re`, e.g. "\\w" -> "0-9A-Z_a-z...".
+    """
+    regex = re.compile(escape)
+    ranges = []
+    start = None
+    for cp in range(sys.maxunicode + 1):
+        # the surrogates can't be encoded in the utf-8 strings of RE2
+        matched = not 0xD800 <= cp <= 0xDFFF and regex.match(chr(cp))
+        if matched and start is None:
+            start = cp
+        elif not matched and start is not None:
+            ranges.append((start, cp - 1))
+            start = None
+    if start is not None:
+        ranges.append((start, sys.maxunicode))
+
+    def char(cp):
+        # the non-latin characters are written literally, as the
+        # escapes of the code points above \xff differ among the engines
+        if cp < 0x100:
+            return "\\x{:02x}".format(cp)
+        return chr(cp)
+
+    return "".join(char(a) if a == b else char(a) + "-" + char(b)
+                   for a, b in ranges)
+
+
+REPEATS = {sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT}
+
+
+def has_repeated_groups(pattern):
+    """
+    Check if a pattern has a capturing group within a repeat, e.g. "(a)+".
+    The `findall` of regex returns tuples for them, instead of strings.
+    """
+
+    def walk(items, repeated):
+        for op, av in items:
+            if op is sre_parse.SUBPATTERN and repeated and av[0] is not None:
+                return True
+            children = av if isinstance(av, (tuple, list)) else [av]
+            for child in children:
+                if isinstance(child, list):
+                    if any(walk(c, repeated or op in REPEATS) for c in child
+                           if isinstance(c, sre_parse.SubPattern)):
+                        return True
+                elif isinstance(child, sre_parse.SubPattern):
+                    if walk(child, repeated or op in REPEATS):
+                        return True
+        return False
+
+    return walk(sre_parse.parse(pattern), False)
+
+
+UNSUPPORTED_RE2 = re.compile(r"\(\?<?[=!]|\(\?P=|\\[1-9bBAZ]")
+POSIX_CLASS = re.compile(r"\[:\w+:\]")
+# a class escape, which is not itself escaped (e.g. \w, but not \\w)
+UNICODE_CLASS = re.compile(r"(?<!\\)(?:\\\\)*\\[wWdDsSbB]")
+
+
+def rewrite_re2(pattern):
+    """
+    Rewrite a pattern of `re` to an equivalent pattern of RE2.
+
+    Raises:
+        IncompatibleExpression: if the pattern uses constructs that RE2
+            does not support or that behave differently in RE2
+    """
+    if UNSUPPORTED_RE2.search(pattern):
+        raise IncompatibleExpression("lookarounds, backreferences "
+                                     "and word boundaries are not supported")
+
+    out = []
+    in_set = False
+    i = 0
+    while i < len(pattern):
+        c = pattern[i]
+        if c == "\\" and i + 1 < len(pattern):
+            escape = pattern[i:i + 2]
+            if escape[1] in "wds":
+                ranges = unicode_class(escape)
+                out.append(ranges if in_set else "[" + ranges + "]")
+            elif escape[1] in "WDS":
+                if in_set:
+                    raise IncompatibleExpression(
+                        "negated classes within sets are not supported")
+                out.append("[^" + unicode_class(escape.lower()) + "]")
+            else:
+                out.append(escape)
+            i += 2
+            continue
+
+        if in_set:
+            if c == "[":
+                # a literal "[" within a set
+                out.append("\\[")
+                i += 1
+                continue
+            if c == "]":
+                in_set = False
+        elif c == "[":
+            in_set = True
+            out.append(c)
+            i += 1
+            # a "^" and/or a "]" right after the opening bracket
+            if pattern[i:i + 1] == "^":
+                out.append("^")
+                i += 1
+            if pattern[i:i + 1] == "]":
+                out.append("\\]")
+                i += 1
+            continue
+        out.append(c)
+        i += 1
+
+    return "".join(out)
+
+
+def to_backend(pattern, backend):
+    """
+    The pattern to use with a backend, for the same behavior as with `re`.
+
+    Raises:
+        IncompatibleExpression: if the backend can't match the pattern
+            like `re` does
+    """
+    if backend == "re":
+        return pattern
+    if backend == "regex":
+        if UNICODE_CLASS.search(pattern):
+            raise IncompatibleExpression("the Unicode classes match "
+                                         "different characters")
+        # regex supports POSIX classes like [[:alpha:]] even in V0 mode
+        if POSIX_CLASS.search(pattern):
+            raise IncompatibleExpression("POSIX classes are ambiguous")
+        if has_repeated_groups(pattern):
+            raise IncompatibleExpression("repeated groups are returned "
+                                         "differently by findall")
+        return "(?V0)" + pattern
+    if backend == "re2":
+        return rewrite_re2(pattern)
+
+
+def compile_expression(pattern, backend="re", flags=0):
+    """
+    Compile a pattern with a backend, falling back to `re`, if the backend
+    is not installed or the pattern is not compatible with it.
+
+    Returns:
+        tuple: (the compiled regex, the name of the backend that was used)
+    """
+    module = load_backend(backend)
+    if module is not None and backend != "re" and not flags:
+        try:
+            return module.compile(to_backend(pattern, backend)), backend
+        except (IncompatibleExpression, module.error):
+            pass
+    return re.compile(pattern, flags), "re"
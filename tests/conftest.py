@@ -0,0 +1,140 @@
+import os
+from collections import Counter
+
+import pytest
+
+from ekphrasis.classes.ngrams import registry
+from ekphrasis.classes.tokenizer import SocialTokenizer, Tokenizer
+from ekphrasis.dicts.emoticons import emoticons
+
+# the statistics of the segmenter and the spell corrector in the tests,
+# which are generated from TEXT, instead of downloading the real ones
+CORPUS = "tiny"
+
+TEXT = """
+i saw the new movie and it was so good so cool and so bad at the same time
+we can not wait for the new season of twin peaks by david lynch on tv series
+the movie was bad and the bad movies are the worst movies of the year
+i love the speed of art and the small and insignificant things in life
+choose spain for the game and the retro gaming and the water cooler
+you are so happy and i am so happy to see you at the talks
+please follow me and call me at home or mail me before the night
+that is very good and it is really good but what a waste of money
+this is the exponential back off of the sentiment symposium
+wow that was cool i love it so much and i want to see it again
+he is the best and she is the best and they are the best of the best
+good night good morning good day new day new year
+""" * 3
+
+# documents that exercise the normalizations, the annotations and the
+# tokenizer, including the tricky interactions between them
+DOCS = [
+    "CANT WAIT for the new season of #TwinPeaks ＼(^o^)／!!! #davidlynch "
+    "#tvseries :))) ",
+    "I saw the new #johndoe movie and it suuuuucks!!! WAISTED $10... "
+    "#badmovies :/",
+    "I saw the new #JOHNDOE movie AND IT SUCKS!!! WAISTED $10... "
+    "#badmovies :/",
+    "@SentimentSymp:  can't wait for the Nov 9 #Sentiment talks!  "
+    "YAAAAAAY !!! :-D http://sentimentsymposium.com/.",
+    "Thanks x https://t.co/ZXTcDLyDS9",
+    "@Calum5SOS You lil poop please follow @EmilyBain224 ☺️💕",
+    "this is *very* good, f**k yeah sooooo guuuuud!!?!",
+    "Call me at +1 555-123-4567 or mail john.doe@example.com before "
+    "10:30pm on 12/05/2017",
+    "It costs $5.50 or 20% off &amp; more &lt;3 <br> stuff",
+    "#chooseSpain #speedofart #smallandinsignificant I'm HAPPY",
+    "We'll see... they're gonna LOVE IT!!!!! <3 ^5 (>_<) xD :P",
+    "Line one\nline TWO with NEWLINE\tand tab",
+    "",
+    "   ",
+    "NO WAY NO HOW",
+    "#gamedev #retrogaming #thewatercooler yaaaaaay",
+    "wooooow that's sooo coooool, I loooove it",
+    "#1 is #Hello_World-2 and #2016 #A",
+    "@https://t.co/x john.doe@mail.comhttps://t.co/y",
+    "f**kguuuuud season*really* *** **bold** a*b",
+    "café naïve coöperate ελληνικά नमस्ते 日本語",
+    "a\x1cb\x1d c\x1e\x1fd",
+    "$YAAAAAAY 5$ABC +1$HOW 3.5% 100%!!!",
+    "WHAT?!?! REALLY??? ok...... !!!! ????",
+    "#SoHappy :-) :-( :'( ;) <3 </3 :D :-P",
+    "http://a.com/b?c=d&amp;e=f www.example.org/x",
+    "RT @user: #hashtag_with_underscores #CamelCaseTag #ALLCAPSTAG",
+    "I'M SOOOO HAPPY!!! #yay",
+    "the time is 5:30 am or 17:45, date 2017-12-05 or Dec 5th",
+    "u.s.a. U.S.A. e.g. i.e. etc.",
+]
+
+
+def write_counts(filename, counts):
+    with open(filename, "w", encoding="utf-8") as f:
+        for ngram, count in counts.items():
+            f.write("\t".join(ngram) + "\t" + str(count) + "\n")
+
+
+@pytest.fixture(scope="session")
+def stats_corpus(tmp_path_factory):
+    """
+    A home directory with the statistics of the tiny corpus.
+
+    Returns:
+        str: the name of the corpus
+    """
+    home = tmp_path_factory.mktemp("home")
+    corpus_dir = home / ".ekphrasis" / "stats" / CORPUS
+    corpus_dir.mkdir(parents=True)
+
+    words = TEXT.split()
+    write_counts(str(corpus_dir / "counts_1grams.txt"),
+                 Counter((w,) for w in words))
+    write_counts(str(corpus_dir / "counts_2grams.txt"),
+                 Counter(zip(words, words[1:])))
+
+    old_home = os.environ.get("HOME")
+    os.environ["HOME"] = str(home)
+    yield CORPUS
+    registry.unload(CORPUS)
+    if old_home is None:
+        del os.environ["HOME"]
+    else:
+        os.environ["HOME"] = old_home
+
+
+@pytest.fixture
+def docs():
+    return list(DOCS)
+
+
+@pytest.fixture
+def configs(stats_corpus):
+    """
+    Some configurations of the TextPreProcessor, by name.
+    """
+    corpus = stats_corpus
+    return {
+        "full": dict(normalize=['url', 'email', 'percent', 'money', 'phone',
+                                'user', 'time', 'date', 'number'],
+                     annotate={"hashtag", "allcaps", "elongated", "repeated",
+                               "emphasis", "censored"},
+                     unpack_hashtags=True, unpack_contractions=True,
+                     spell_correct_elong=True,
+                     segmenter=corpus, corrector=corpus,
+                     tokenizer=SocialTokenizer(lowercase=True).tokenize,
+                     dicts=[emoticons]),
+        "single": dict(normalize=['user', 'number'],
+                       annotate={"allcaps", "hashtag", "elongated"},
+                       all_caps_tag="single", unpack_hashtags=True,
+                       segmenter=corpus, corrector=corpus,
+                       tokenizer=SocialTokenizer().tokenize),
+        "every": dict(omit=['url'], normalize=['user'],
+                      annotate={"allcaps", "repeated", "censored"},
+                      all_caps_tag="every", segmenter=corpus,
+                      corrector=corpus, tokenizer=SocialTokenizer().tokenize),
+        "fast": dict(mode="fast", normalize=['url'], unpack_hashtags=True,
+                     segmenter=corpus, corrector=corpus,
+                     tokenizer=Tokenizer().tokenize),
+        "tags": dict(normalize=['url', 'user'], annotate={"repeated"},
+                     remove_tags=True, segmenter=corpus, corrector=corpus,
+                     tokenizer=SocialTokenizer().tokenize),
+    }
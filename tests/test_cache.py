@@ -0,0 +1,130 @@
+import sys
+import threading
+from collections import OrderedDict
+
+import pytest
+
+from ekphrasis.utils.cache import LFUCache, LRUCache, make_cache
+
+
+def test_lru_evicts_the_least_recently_used():
+    cache = LRUCache(2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert "b" not in cache
+    assert cache.items() == [("a", 1), ("c", 3)]
+    assert cache.get("b") is None
+    assert cache.info() == (1, 1, 2, 2)
+
+
+def test_lfu_evicts_the_least_frequently_used():
+    cache = LFUCache(2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")
+    cache.get("a")
+    cache.get("b")
+    cache.put("c", 3)
+    assert "b" not in cache
+    # ties are broken by recency
+    cache.put("d", 4)
+    assert "c" not in cache
+    assert cache.items() == [("d", 4), ("a", 1)]
+
+
+@pytest.mark.parametrize("policy", ["lru", "lfu"])
+def test_get_or_compute(policy):
+    cache = make_cache(1, policy)
+    calls = []
+
+    def compute(x):
+        calls.append(x)
+        return x * 2
+
+    assert cache.get_or_compute(1, compute, 1) == 2
+    assert cache.get_or_compute(1, compute, 1) == 2
+    assert cache.get_or_compute(2, compute, 2) == 4
+    assert calls == [1, 2]
+    assert len(cache) == 1
+
+
+@pytest.mark.parametrize("policy", ["lru", "lfu"])
+def test_unbounded_and_disabled(policy):
+    cache = make_cache(None, policy)
+    for i in range(1000):
+        cache.put(i, i)
+    assert len(cache) == 1000
+
+    cache = make_cache(0, policy)
+    cache.put(1, 1)
+    assert len(cache) == 0
+
+
+def test_save_and_load(tmp_path):
+    cache = LRUCache(10)
+    cache.put("a", [1, 2])
+    cache.put("b", [3])
+    filename = str(tmp_path / "cache.json")
+    cache.save(filename)
+
+    warm = LRUCache(10)
+    warm.load(filename)
+    assert warm.items() == cache.items()
+
+
+class EvictingDict(OrderedDict):
+    """
+    Evicts each key right after it is read, like another thread would
+    between the lookup and the update of the cache.
+    """
+
+    def __getitem__(self, key):
+        value = super().__getitem__(key)
+        self.popitem(last=False)
+        return value
+
+
+def test_lru_key_evicted_after_the_lookup():
+    cache = LRUCache(2)
+    cache.put("a", 1)
+    cache.data = EvictingDict(cache.data)
+    assert cache.get("a") is None
+    assert cache.info() == (0, 1, 2, 0)
+
+
+@pytest.mark.parametrize("policy", ["lru", "lfu"])
+def test_concurrent_eviction(policy):
+    # a small cache with many keys, so that the keys are evicted by the
+    # other threads between the lookups and the updates
+    cache = make_cache(8, policy)
+    errors = []
+
+    def work(seed):
+        try:
+            for i in range(20000):
+                key = (i * seed) % 64
+                value = cache.get(key)
+                assert value is None or value == key
+                cache.put(key, key)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=work, args=(seed,))
+               for seed in (1, 3, 5, 7)]
+    # switch between the threads as often as possible
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        sys.setswitchinterval(interval)
+
+    assert errors == []
+    assert len(cache) == 8
+    hits, misses, _, _ = cache.info()
+    assert hits + misses == 4 * 20000
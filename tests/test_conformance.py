@@ -0,0 +1,24 @@
+import json
+import os
+
+import pytest
+
+from ekphrasis.classes.preprocessor import TextPreProcessor
+
+# the output of the original (multi-pass) pre-processor on the docs,
+# for each one of the configs (see conftest)
+EXPECTED = os.path.join(os.path.dirname(__file__), "data", "conformance.json")
+
+
+def load_expected():
+    with open(EXPECTED, encoding="utf-8") as f:
+        return json.load(f)
+
+
+@pytest.mark.parametrize("name", ["full", "single", "every", "fast", "tags"])
+def test_pre_process_doc_conformance(name, configs, docs):
+    processor = TextPreProcessor(**configs[name])
+    expected = load_expected()[name]
+    assert len(expected) == len(docs)
+    for doc, tokens in zip(docs, expected):
+        assert processor.pre_process_doc(doc) == tokens, doc
@@ -0,0 +1,142 @@
+import html
+import random
+from itertools import accumulate
+
+from ekphrasis.classes.ngramcounter import REGEX_TOKEN, REGEX_URL, \
+    ApproxNgramCounter, NgramCounter
+
+LINES = [
+    "the quick brown fox jumps over the lazy dog",
+    "the lazy dog sleeps",
+    "a quick brown dog jumps over the fox",
+    "",
+    "the the the fox",
+    "over and over and over again",
+]
+
+
+def ngram_stats(counter, n):
+    return {"_".join(tokens): count for tokens, count in counter.items(n)}
+
+
+def naive_counts(lines, order, web_fix=True):
+    """
+    The counts of the original generate_stats, which counted each line
+    separately.
+    """
+    counts = {}
+    for line in lines:
+        if web_fix:
+            line = html.unescape(REGEX_URL.sub(' ', line))
+        tokens = REGEX_TOKEN.findall(line.lower())
+        if not tokens:
+            continue
+        for n in range(1, order + 1):
+            padded = ["<S>"] * (n - 1) + tokens
+            for i in range(len(padded) - n + 1):
+                ngram = "_".join(padded[i:i + n])
+                counts[ngram] = counts.get(ngram, 0) + 1
+    return counts
+
+
+def all_stats(counter):
+    stats = {}
+    for n in counter.ngrams:
+        stats.update(ngram_stats(counter, n))
+    return stats
+
+
+def test_counts_match_naive():
+    counter = NgramCounter(order=3)
+    # in chunks, so that the pending counts are merged into the totals
+    for line in LINES:
+        counter.add_lines([line])
+
+    assert all_stats(counter) == naive_counts(LINES, 3)
+
+
+def test_counts_after_widening():
+    # an 8-gram key packs 8 ids of 8 bits, which fit only 256 tokens,
+    # so a few thousand tokens are enough to widen its keys
+    rng = random.Random(0)
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    words = sorted({"".join(rng.choice(letters) for _ in range(6))
+                    for _ in range(3000)})
+    lines = [" ".join(rng.choice(words) for _ in range(12))
+             for _ in range(200)]
+
+    counter = NgramCounter(order=8)
+    counter.add_lines(lines[:100])
+    counter.add_lines(lines[100:])
+    assert counter.per_word[8] < 8
+
+    expected = {ngram: count
+                for ngram, count in naive_counts(lines, 8).items()
+                if ngram.count("_") == 7}
+    assert ngram_stats(counter, 8) == expected
+
+
+def test_line_break_references_do_not_split_lines():
+    lines = ["in that case&#10;newline here",
+             "a &NewLine; b &amp; c&#x0A;d",
+             "&#10;start",
+             "see http://t.co/x&#10;now &lt;3"]
+    counter = NgramCounter(order=3)
+    counter.add_lines(lines)
+
+    stats = all_stats(counter)
+    assert stats == naive_counts(lines, 3)
+    assert stats["case_newline"] == 1
+    assert "<S>_newline" not in stats
+
+
+def zipf_lines(n_lines, vocabulary, seed=0):
+    """
+    Lines of 10 words, with Zipf-distributed frequencies.
+    """
+    rng = random.Random(seed)
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    words = ["".join(letters[int(d)] for d in str(i))
+             for i in range(vocabulary)]
+    cum_weights = list(accumulate(1 / (i + 1) for i in range(vocabulary)))
+    return [" ".join(rng.choices(words, cum_weights=cum_weights, k=10))
+            for _ in range(n_lines)]
+
+
+def test_approx_counts_are_exact_within_the_budget():
+    lines = zipf_lines(500, 300)
+    counter = ApproxNgramCounter(order=2, memory=4)
+    for i in range(0, len(lines), 100):
+        counter.add_lines(lines[i:i + 100])
+
+    assert all_stats(counter) == naive_counts(lines, 2)
+    for n in counter.ngrams:
+        bounds = counter.error_bounds(n)
+        assert bounds["summary_error"] == bounds["min_count"] == 0
+        assert bounds["max_error"] == 0
+
+
+def test_approx_counts_error_bounds():
+    # ~20k distinct unigrams and ~150k bigrams, with a budget of
+    # 4096 entries per order
+    lines = zipf_lines(20000, 20000)
+    counter = ApproxNgramCounter(order=2, memory=1)
+    for i in range(0, len(lines), 2000):
+        counter.add_lines(lines[i:i + 2000])
+
+    exact = naive_counts(lines, 2)
+    for n in counter.ngrams:
+        bounds = counter.error_bounds(n)
+        approx = ngram_stats(counter, n)
+        true = {k: v for k, v in exact.items() if k.count("_") == n - 1}
+        assert bounds["total"] == sum(true.values())
+        assert bounds["summary_error"] > 0
+        assert len(approx) <= bounds["capacity"] < len(true)
+
+        # never underestimated, and overestimated at most by the bound
+        for ngram, count in approx.items():
+            assert true[ngram] <= count <= true[ngram] + \
+                bounds["summary_error"]
+        # the frequent ngrams are always kept
+        assert all(ngram in approx for ngram, count in true.items()
+                   if count > bounds["min_count"])
@@ -0,0 +1,80 @@
+import pytest
+
+from ekphrasis.classes.preprocessor import RECORD_SEP, TextPreProcessor
+
+CONFIGS = ["full", "single", "every", "fast", "tags"]
+
+
+@pytest.mark.parametrize("name", CONFIGS)
+@pytest.mark.parametrize("fix_bad_unicode", [False, True])
+def test_pre_process_batch_matches_per_doc(name, fix_bad_unicode, configs,
+                                           docs):
+    processor = TextPreProcessor(fix_bad_unicode=fix_bad_unicode,
+                                 **configs[name])
+    expected = [processor.pre_process_doc(d) for d in docs]
+    assert processor.pre_process_batch(docs) == expected
+
+
+def test_pre_process_batch_edge_cases(configs):
+    processor = TextPreProcessor(**configs["full"])
+    assert processor.pre_process_batch([]) == []
+    # documents with the separator itself, and a batch of one document
+    for docs in (["SOOO " + RECORD_SEP + " cool", "the new #TwinPeaks",
+                  RECORD_SEP, "YAAAAAAY :-D"],
+                 ["so coooool #TwinPeaks"]):
+        expected = [processor.pre_process_doc(d) for d in docs]
+        assert processor.pre_process_batch(iter(docs)) == expected
+
+
+@pytest.mark.parametrize("n_jobs,chunksize", [(1, 1000), (2, 4), (-1, 7)])
+def test_pre_process_docs_matches_serial(n_jobs, chunksize, configs, docs):
+    processor = TextPreProcessor(**configs["full"])
+    expected = [processor.pre_process_doc(d) for d in docs]
+    processed = processor.pre_process_docs(iter(docs), n_jobs=n_jobs,
+                                           chunksize=chunksize)
+    assert list(processed) == expected
+
+
+@pytest.mark.parametrize("kwargs", [dict(n_jobs=0), dict(n_jobs=-2),
+                                    dict(n_jobs=2, chunksize=0)])
+def test_pre_process_docs_invalid_arguments(kwargs, configs, docs):
+    processor = TextPreProcessor(**configs["single"])
+    # raised on the call, before any document is consumed
+    with pytest.raises(ValueError):
+        processor.pre_process_docs(docs, **kwargs)
+
+
+@pytest.mark.parametrize("name", CONFIGS)
+def test_spans_match_pre_process_doc(name, configs, docs):
+    processor = TextPreProcessor(**configs[name])
+    for doc in docs:
+        spans = processor.pre_process_doc_spans(doc)
+        assert [token for _, _, token, _ in spans] == \
+            processor.pre_process_doc(doc)
+        starts = [start for start, _, _, _ in spans]
+        assert starts == sorted(starts)
+        assert all(0 <= start <= end <= len(doc)
+                   for start, end, _, _ in spans)
+
+
+def test_spans_of_the_annotations(configs):
+    processor = TextPreProcessor(**configs["full"])
+    doc = "I saw the new #TwinPeaks movie SOOOO GOOD &lt;3"
+    assert processor.pre_process_doc_spans(doc)[3:] == [
+        (10, 13, "new", "WORD"), (14, 24, "<hashtag>", "TAG"),
+        (14, 24, "twin", "WORD"), (14, 24, "peaks", "WORD"),
+        (14, 24, "</hashtag>", "TAG"), (25, 30, "movie", "WORD"),
+        (31, 41, "<allcaps>", "TAG"), (31, 41, "so", "WORD"),
+        (31, 41, "<elongated>", "TAG"), (31, 41, "good", "WORD"),
+        (31, 41, "</allcaps>", "TAG"), (42, 46, "<", "OTHER"),
+        (46, 47, "<number>", "TAG")]
+
+
+def test_spans_with_a_custom_tokenizer(configs):
+    kwargs = dict(configs["single"], tokenizer=str.split)
+    processor = TextPreProcessor(**kwargs)
+    doc = "so   HAPPY @user!!"
+    assert processor.pre_process_doc_spans(doc) == [
+        (0, 2, "so", None), (5, 10, "HAPPY", None),
+        (5, 10, "<allcaps>", None), (11, 16, "<user>", None),
+        (16, 18, "!!", None)]
@@ -0,0 +1,58 @@
+import re
+import warnings
+
+import pytest
+
+from ekphrasis.classes.exmanager import ExManager
+from ekphrasis.classes.tokenizer import SocialTokenizer, Tokenizer
+from ekphrasis.utils.regex_backends import IncompatibleExpression, \
+    compile_expression, to_backend
+
+pytest.importorskip("regex")
+
+TEXTS = [
+    "café au lait",
+    "नमस्ते दुनिया",
+    "a\x1cb\x1d c\x1e\x1fd",
+    "\x00\x08\x7f\x85  control",
+    "Ελληνικά κείμενα 123 ٣٤٥ ٠١",
+    "日本語のテキスト、ＡＢＣ１２３",
+    "ǅ ß ﬁ \xa0nbsp​zero width",
+    "I saw the new #johndoe movie and it suuuuucks!!! WAISTED $10... "
+    "#badmovies >3:/ @user http://t.co/x :-) 😀",
+]
+
+
+@pytest.fixture(autouse=True)
+def ignore_future_warnings():
+    # some expressions have sets that look nested to re
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", FutureWarning)
+        yield
+
+
+@pytest.mark.parametrize("pattern", [r"\w+", r"\W", r"[\s]", r"\d", r"a\b",
+                                     r"\B"])
+def test_unicode_classes_are_incompatible(pattern):
+    with pytest.raises(IncompatibleExpression):
+        to_backend(pattern, "regex")
+
+
+def test_escaped_backslash_is_compatible():
+    assert to_backend(r"\\w", "regex") == r"(?V0)\\w"
+
+
+def test_expressions_match_like_re():
+    for name, pattern in ExManager().expressions.items():
+        compiled = compile_expression(pattern, "regex")[0]
+        expected = re.compile(pattern)
+        for text in TEXTS:
+            assert compiled.findall(text) == expected.findall(text), name
+
+
+@pytest.mark.parametrize("tokenizer", [SocialTokenizer, Tokenizer])
+def test_tokens_match_re(tokenizer):
+    reference = tokenizer(backend="re")
+    accelerated = tokenizer(backend="regex")
+    for text in TEXTS:
+        assert accelerated.tokenize(text) == reference.tokenize(text)
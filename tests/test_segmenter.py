@@ -0,0 +1,118 @@
+import gc
+import random
+import sys
+import weakref
+from math import log10
+
+import pytest
+
+from ekphrasis.classes.segmenter import Segmenter
+
+
+def test_caches_are_per_instance(stats_corpus):
+    first = Segmenter(corpus=stats_corpus, cache_size=2)
+    second = Segmenter(corpus=stats_corpus)
+    first.segment("choosespain")
+    assert second.cache_info()["segment"].currsize == 0
+
+    for word in ["speedofart", "newmovie", "badmovies", "gooddaynewyear"]:
+        first.segment(word)
+    info = first.cache_info()
+    assert info["segment"].maxsize == 2
+    assert info["segment"].currsize == 2
+    assert info["find_segment"].currsize <= 2
+
+    first.segment("gooddaynewyear")
+    assert first.cache_info()["segment"].hits == 1
+    first.cache_clear()
+    assert first.cache_info()["segment"] == (0, 0, 2, 0)
+    first.close()
+    second.close()
+
+
+def test_caches_do_not_keep_the_segmenter_alive(stats_corpus):
+    seg = Segmenter(corpus=stats_corpus)
+    seg.segment("choosespain")
+    seg.close()
+    ref = weakref.ref(seg)
+    del seg
+    gc.collect()
+    assert ref() is None
+
+
+@pytest.mark.parametrize("policy", ["lru", "lfu"])
+def test_cache_file(policy, stats_corpus, tmp_path):
+    filename = str(tmp_path / "segments.json")
+    seg = Segmenter(corpus=stats_corpus, cache_policy=policy)
+    words = ["choosespain", "speedofart", "BbcTest"]
+    segmented = [seg.segment(w) for w in words]
+    seg.save_cache(filename)
+    seg.close()
+
+    warm = Segmenter(corpus=stats_corpus, cache_policy=policy,
+                     cache_file=filename)
+    assert warm.cache_info()["segment"].currsize == len(words)
+    assert [warm.segment(w) for w in words] == segmented
+    assert warm.cache_info()["segment"].hits == len(words)
+    assert warm.cache_info()["find_segment"].currsize == 0
+    warm.close()
+
+
+def recursive_segment(seg, text, prev="<S>", memo=None):
+    """
+    The original (recursive) find_segment of the Segmenter.
+    """
+    if memo is None:
+        memo = {}
+    if not text:
+        return 0.0, []
+    if (text, prev) not in memo:
+        memo[text, prev] = max(
+            seg.combine((log10(seg.condProbWord(first, prev)), first),
+                        recursive_segment(seg, rem, first, memo))
+            for first, rem in seg.splits(text))
+    return memo[text, prev]
+
+
+def test_viterbi_matches_recursive(stats_corpus):
+    seg = Segmenter(corpus=stats_corpus, max_split_length=12)
+    rng = random.Random(0)
+    vocabulary = sorted(seg.unigrams)
+    texts = ["choosespain", "speedofart", "smallandinsignificant", "a",
+             "qqq", "thebestofthebest", "xyzthemoviezzz"]
+    texts += ["".join(rng.sample(vocabulary, rng.randint(1, 6)))
+              for _ in range(100)]
+
+    for text in texts:
+        score, words = seg.find_segment(text)
+        expected_score, expected_words = recursive_segment(seg, text)
+        assert words == expected_words, text
+        assert score == pytest.approx(expected_score)
+    seg.close()
+
+
+def test_viterbi_long_input(stats_corpus):
+    seg = Segmenter(corpus=stats_corpus)
+    text = "thebestmovieoftheyear" * 100
+    assert len(text) > sys.getrecursionlimit()
+    score, words = seg.find_segment(text)
+    assert "".join(words) == text
+    assert words[:5] == ["the", "best", "movie", "of", "the"]
+    seg.close()
+
+
+@pytest.mark.parametrize("shared_stats", [False, True])
+def test_log_probabilities(stats_corpus, shared_stats):
+    seg = Segmenter(corpus=stats_corpus, shared_stats=shared_stats)
+    pairs = [("movie", "new"), ("good", "so"), ("movie", "the"),
+             ("spain", "so"), ("xyz", "the"), ("the", "xyz"), ("new", "<S>")]
+    for word, prev in pairs:
+        assert seg.condLogProbWord(word, prev) == pytest.approx(
+            log10(seg.condProbWord(word, prev)))
+    for word in ["the", "movie", "xyz", "q"]:
+        assert seg.Pw.logp(word) == pytest.approx(log10(seg.Pw(word)))
+
+    # the probability of a long unknown word is not representable as a float
+    word = "x" * 400
+    assert seg.Pw.logp(word) == pytest.approx(1 - log10(seg.N) - 400)
+    seg.close()
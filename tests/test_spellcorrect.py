@@ -0,0 +1,88 @@
+import pytest
+
+from ekphrasis.classes.ngrams import registry
+from ekphrasis.classes.spellcorrect import SpellCorrector
+from ekphrasis.classes.spellindex import damerau_levenshtein
+
+
+def test_max_distance_bounds_the_candidates(stats_corpus):
+    # no word of the corpus is within distance 2 of "qqq"
+    corrector = SpellCorrector(corpus=stats_corpus, index="symspell",
+                               max_distance=2)
+    assert corrector.edit_candidates("qqq") == ["qqq"]
+    corrector.close()
+
+    corrector = SpellCorrector(corpus=stats_corpus, index="symspell",
+                               max_distance=3)
+    candidates = corrector.edit_candidates("qqq")
+    assert candidates != ["qqq"]
+    assert all(damerau_levenshtein("qqq", c) == 3 for c in candidates)
+    corrector.close()
+
+
+@pytest.mark.parametrize("index", ["trie", "bktree", "unknown"])
+def test_unknown_index(stats_corpus, index):
+    with pytest.raises(ValueError):
+        SpellCorrector(corpus=stats_corpus, index=index)
+
+
+def test_distance_3_requires_an_index(stats_corpus):
+    with pytest.raises(ValueError):
+        SpellCorrector(corpus=stats_corpus, max_distance=3)
+
+
+def test_invalid_arguments_do_not_acquire_the_stats(stats_corpus):
+    loaded = registry.info()
+    for kwargs in [dict(index="trie"), dict(max_distance=4)]:
+        with pytest.raises(ValueError):
+            SpellCorrector(corpus=stats_corpus, **kwargs)
+    assert registry.info() == loaded
+
+
+def test_elong_normalized_candidates(stats_corpus):
+    corrector = SpellCorrector(corpus=stats_corpus)
+    assert corrector.elong_normalized_candidates("sooo") == [
+        "so", "soo", "sooo"]
+    assert corrector.elong_normalized_candidates(
+        "goood", ["good", "x"]) == ["good", "x", "god", "goood"]
+
+    # 2^12 candidates
+    word = "".join(c * 3 for c in "abcdefghijkl")
+    candidates = corrector.elong_normalized_candidates(word)
+    assert len(candidates) == len(set(candidates)) == 2 ** 12 + 1
+    assert candidates[-1] == word
+    corrector.close()
+
+
+@pytest.mark.parametrize("index", [None, "symspell"])
+def test_correct_batch_matches_per_word(stats_corpus, index):
+    corrector = SpellCorrector(corpus=stats_corpus, index=index)
+    tokens = ["teh", "Teh", "TEH", "moive", "the", "Movie", "spian", "xyz",
+              "gud", "teh", "Wokr", "!!!", "", "n0w"]
+    for kwargs in [{}, dict(assume_wrong=True), dict(fast=True)]:
+        assert corrector.correct_batch(tokens, **kwargs) == [
+            corrector.correct_word(token, **kwargs) for token in tokens]
+
+    texts = ["I saw teh new moive", "TEH MOIVE was baad!", "", "so gud"]
+    assert corrector.correct_texts(texts) == [
+        corrector.correct_text(text) for text in texts]
+    corrector.close()
+
+
+def test_correct_batch_corrects_each_type_once(stats_corpus, monkeypatch):
+    corrector = SpellCorrector(corpus=stats_corpus)
+    calls = []
+    correct = corrector.correct
+
+    def counting_correct(word, **kwargs):
+        calls.append(word)
+        return correct(word, **kwargs)
+
+    monkeypatch.setattr(corrector, "correct", counting_correct)
+    corrector.correct_batch(["teh", "Teh", "TEH", "the", "moive", "teh"])
+    assert sorted(calls) == ["moive", "teh"]
+
+    calls.clear()
+    corrector.correct_texts(["teh moive", "TEH the", "Moive"])
+    assert sorted(calls) == ["moive", "teh"]
+    corrector.close()
@@ -0,0 +1,150 @@
+import os
+import random
+from zlib import crc32
+
+import numpy
+import pytest
+
+from ekphrasis.classes.ngramcounter import NgramCounter, merge_shards
+from ekphrasis.classes.ngrams import NgramTable
+from ekphrasis.classes.spellindex import (SymSpellIndex, damerau_levenshtein,
+                                          deletes, load_spell_index)
+
+LINES = [
+    "the quick brown fox jumps over the lazy dog",
+    "the lazy dog sleeps",
+    "a quick brown dog jumps over the fox",
+    "",
+    "the the the fox",
+    "over and over and over again",
+]
+
+VOCAB = ["the", "then", "than", "they", "hte", "quick", "quack", "quiet",
+         "brown", "brow", "crown", "fox", "box", "fix", "dog", "dig", "god",
+         "lazy", "laze", "over", "oven", "ever", "jumps", "jump", "pump"]
+
+
+def ngram_stats(counter, n):
+    return {"_".join(tokens): count for tokens, count in counter.items(n)}
+
+
+def test_ngram_table_round_trip(tmp_path):
+    stats = {"the": 10, "the_fox": 3, "ελληνικά": 2, "dog": 1}
+    filename = str(tmp_path / "counts.bin")
+    NgramTable.from_dict(stats).save(filename)
+
+    table = NgramTable.load(filename)
+    assert dict(table) == stats
+    assert table.get("missing") is None
+    assert "the_fox" in table
+
+
+def test_spell_index_round_trip(tmp_path):
+    filename = str(tmp_path / "symspell.bin")
+    index = SymSpellIndex.from_words(VOCAB, max_distance=2)
+    index.save(filename)
+
+    loaded = SymSpellIndex.load(filename)
+    assert loaded.max_distance == 2
+    for word in ["teh", "quikc", "fo", "lzy", "jumsp"]:
+        assert loaded.lookup(word) == index.lookup(word)
+
+
+def test_spell_index_outdated(tmp_path):
+    source = tmp_path / "counts.txt"
+    source.write_text("the\t1\n")
+    filename = str(tmp_path / "symspell.bin")
+    SymSpellIndex.from_words(VOCAB).save(filename, str(source))
+
+    assert SymSpellIndex.load(filename, str(source)) is not None
+    source.write_text("the\t1\nfox\t2\n")
+    assert SymSpellIndex.load(filename, str(source)) is None
+
+
+def test_spell_index_missing_source(tmp_path):
+    source = tmp_path / "counts.txt"
+    source.write_text("the\t1\n")
+    filename = str(tmp_path / "symspell.bin")
+    SymSpellIndex.from_words(VOCAB).save(filename, str(source))
+
+    source.unlink()
+    assert SymSpellIndex.load(filename, str(source)) is None
+    with pytest.raises(ValueError):
+        SymSpellIndex.from_words(VOCAB).save(filename, str(source))
+
+
+def test_load_spell_index_without_counts(tmp_path, monkeypatch):
+    monkeypatch.setenv("HOME", str(tmp_path))
+    corpus_dir = tmp_path / ".ekphrasis" / "stats" / "vocab"
+    corpus_dir.mkdir(parents=True)
+    filename = corpus_dir / "spellindex_d2.bin"
+    # a stale index, of a vocabulary without "fox"
+    SymSpellIndex.from_words(["the", "dog"]).save(str(filename))
+
+    index = load_spell_index("vocab", VOCAB)
+    assert "fox" in index.lookup("fxo")
+    assert SymSpellIndex.load(str(filename)).lookup("fxo") == {}
+
+    source = corpus_dir / "counts_1grams.txt"
+    source.write_text("".join(w + "\t1\n" for w in VOCAB))
+    os.remove(str(filename))
+    load_spell_index("vocab", VOCAB)
+    assert SymSpellIndex.load(str(filename), str(source)) is not None
+
+
+def test_spell_index_arrays():
+    index = SymSpellIndex.from_words(VOCAB + ["aaaa", "ελληνικά"])
+    words = sorted(VOCAB + ["aaaa", "ελληνικά"])
+    expected = sorted((h, i) for i, w in enumerate(words)
+                      for h in {crc32(d.encode("utf-8"))
+                                for d in deletes(w, 2)})
+    assert index.hashes.dtype == numpy.uint32
+    assert index.ids.dtype == numpy.int32
+    assert list(zip(index.hashes.tolist(), index.ids.tolist())) == expected
+
+
+def test_symspell_matches_brute_force():
+    rng = random.Random(0)
+    index = SymSpellIndex.from_words(VOCAB, max_distance=2)
+    queries = VOCAB + ["teh", "qiuck", "xyz", "", "d", "ovre", "brwon"]
+    for _ in range(200):
+        word = list(rng.choice(VOCAB))
+        for _ in range(rng.randint(1, 3)):
+            i = rng.randrange(len(word) + 1)
+            edit = rng.choice(["insert", "delete", "replace", "swap"])
+            if edit == "insert":
+                word.insert(i, rng.choice("abcdefghijklmnopqrstuvwxyz"))
+            elif edit == "delete" and i < len(word):
+                del word[i]
+            elif edit == "replace" and i < len(word):
+                word[i] = rng.choice("abcdefghijklmnopqrstuvwxyz")
+            elif edit == "swap" and i + 1 < len(word):
+                word[i], word[i + 1] = word[i + 1], word[i]
+        queries.append("".join(word))
+
+    for word in queries:
+        for max_distance in (1, 2):
+            expected = {}
+            for w in VOCAB:
+                distance = damerau_levenshtein(word, w)
+                if distance <= max_distance:
+                    expected[w] = distance
+            assert index.lookup(word, max_distance) == expected, word
+
+
+def test_shards_match_serial_counts(tmp_path):
+    serial = NgramCounter(order=3)
+    serial.add_lines(LINES)
+
+    paths = []
+    for i, chunk in enumerate([LINES[:2], LINES[2:4], LINES[4:]]):
+        counter = NgramCounter(order=3)
+        counter.add_lines(chunk)
+        path = str(tmp_path / "shard{}".format(i))
+        counter.write_shard(path)
+        paths.append(path)
+
+    for n in range(1, 4):
+        merged = {ngram.replace("\t", "_"): count
+                  for ngram, count in merge_shards(paths, n)}
+        assert merged == ngram_stats(serial, n)
@@ -0,0 +1,119 @@
+import html
+import random
+import re
+
+import pytest
+
+from ekphrasis.classes.exmanager import CompiledExpressions, ExManager
+from ekphrasis.classes.tokenizer import (PrefilterScanner, SocialTokenizer,
+                                         Tokenizer)
+from ekphrasis.utils.alignment import AlignedText
+from ekphrasis.utils.prefilter import FirstSet
+
+# the characters of the random texts
+ALPHABET = ("abcxyzABCXYZ0159 \t\n.,:;!?'\"-_/\\@#$%&*+=<>()[]{}^~|"
+            "éñΩж日😀❤️☺＼／")
+
+
+def random_texts(n, seed=0):
+    rng = random.Random(seed)
+    return ["".join(rng.choice(ALPHABET) for _ in range(rng.randint(0, 40)))
+            for _ in range(n)]
+
+
+def test_pipelines_are_compiled_once():
+    assert Tokenizer().tok is Tokenizer(lowercase=True).tok
+    assert SocialTokenizer().tok is SocialTokenizer(lowercase=True).tok
+    assert SocialTokenizer().tok is not SocialTokenizer(emojis=False).tok
+    assert Tokenizer(pipeline=["WORD"]).tok is not Tokenizer().tok
+
+
+def test_shared_pipelines_match_a_new_compilation(docs):
+    for tokenizer in [Tokenizer(), SocialTokenizer(),
+                      SocialTokenizer(hashtags=False, emoticons=False)]:
+        regex = re.compile(r"({})".format("|".join(tokenizer.pipeline)))
+        for doc in docs:
+            assert tokenizer.tokenize(doc) == regex.findall(
+                html.unescape(doc))
+
+
+def test_shared_expressions():
+    shared = ExManager().get_shared()
+    assert ExManager().get_shared() is shared
+    assert shared["hashtag"] is ExManager().get_shared()["hashtag"]
+
+    compiled = ExManager().get_compiled()
+    assert compiled == ExManager().get_compiled()
+    assert compiled is not ExManager().get_compiled()
+    del compiled["hashtag"]
+    assert "hashtag" in shared
+
+
+def test_expressions_are_compiled_lazily():
+    expressions = CompiledExpressions(ExManager.expressions)
+    assert expressions.compiled == {}
+    assert expressions["hashtag"].pattern == ExManager.expressions["HASHTAG"]
+    assert list(expressions.compiled) == ["hashtag"]
+    assert len(expressions) == len(ExManager.expressions)
+    assert set(expressions.report().values()) == {"re"}
+    assert len(expressions.compiled) == len(ExManager.expressions)
+
+
+@pytest.mark.parametrize("tokenizer", [
+    Tokenizer, SocialTokenizer,
+    lambda **kwargs: SocialTokenizer(emoticons=False, numbers=False,
+                                     **kwargs)])
+def test_prefilter_tokens_match(tokenizer, docs):
+    for lowercase in (False, True):
+        normal = tokenizer(lowercase=lowercase)
+        prefiltered = tokenizer(lowercase=lowercase, prefilter=True)
+        assert isinstance(prefiltered.tok, PrefilterScanner)
+        for text in docs + random_texts(300):
+            assert prefiltered.tokenize(text) == normal.tokenize(text), text
+
+
+def test_first_sets_are_conservative(docs):
+    texts = docs + random_texts(100, seed=1)
+    for name, exp in ExManager.expressions.items():
+        regex = re.compile(exp)
+        first = FirstSet(exp)
+        for text in texts:
+            for pos in range(len(text)):
+                m = regex.match(text, pos)
+                if m is not None and m.end() > pos:
+                    assert text[pos] in first, (name, text[pos:])
+
+
+def test_prefilter_rejects_empty_matches():
+    with pytest.raises(ValueError):
+        PrefilterScanner((r"\w+", r"x*"))
+
+
+@pytest.mark.parametrize("tokenizer", [Tokenizer, SocialTokenizer])
+def test_token_spans(tokenizer, docs):
+    tok = tokenizer()
+    for doc in docs + random_texts(100, seed=2):
+        spans = tok.tokenize_spans(doc)
+        assert [token for _, _, token, _ in spans] == tok.tokenize(doc)
+        assert [(token, _type) for _, _, token, _type in spans] == \
+            tok.tokenize_typed(doc)
+        if html.unescape(doc) == doc:
+            assert all(doc[start:end] == token
+                       for start, end, token, _ in spans)
+        ends = [0] + [end for _, end, _, _ in spans]
+        assert all(end <= start for (start, _, _, _), end in zip(spans, ends))
+
+    spans = SocialTokenizer(lowercase=True).tokenize_spans(
+        "More &lt;3 &amp; #Love")
+    assert spans == [(0, 4, "more", "WORD"), (5, 10, "<3", "REST_EMOTICONS"),
+                     (11, 16, "&", "OTHER"), (17, 22, "#love", "HASHTAG")]
+
+
+def test_spans_of_partial_references():
+    # only the known prefix of a name without ";" is replaced
+    text = "x &ampy &Z95 &#60;3 &lt"
+    assert AlignedText(text).unescape_html().text == html.unescape(text)
+    assert SocialTokenizer().tokenize_spans(text) == [
+        (0, 1, "x", "WORD"), (2, 6, "&", "OTHER"), (6, 7, "y", "WORD"),
+        (8, 9, "&", "OTHER"), (9, 12, "Z95", "WORD"),
+        (13, 19, "<3", "REST_EMOTICONS"), (20, 23, "<", "OTHER")]
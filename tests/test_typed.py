@@ -0,0 +1,93 @@
+import pytest
+
+from ekphrasis.classes.preprocessor import TextPreProcessor
+from ekphrasis.classes.tokenizer import SocialTokenizer, Tokenizer
+
+# documents in which the tokens of the tokenizer agree with the matches
+# of the regexes of the pre-processor
+AGREE = [
+    "CANT WAIT for the new season of #TwinPeaks !!! #davidlynch :)))",
+    "this is *very* good, f**k yeah sooooo guuuuud!!?!",
+    "I'M SOOOO HAPPY!!! #yay",
+    "@user: can't wait for the Nov 9 #Sentiment talks! http://t.co/x",
+]
+
+# (config, document, output of pre_process_doc, output of the typed mode),
+# for the differences that are documented in pre_process_doc_typed
+DIFFERENCES = [
+    ("single", "It costs $10 or 20% off",
+     ["It", "costs", "$", "<number>", "or", "<number>", "%", "off"],
+     ["It", "costs", "$10", "or", "20%", "off"]),
+    ("single", "Call +1 555-123-4567 on 12/05/2017",
+     ["Call", "+", "<number>", "<number>", "-", "<number>", "-", "<number>",
+      "on", "<number>", "/", "<number>", "/", "<number>"],
+     ["Call", "+1 555-123-4567", "on", "12/05/2017"]),
+    ("full", "more &lt;3 stuff",
+     ["more", "<", "<number>", "stuff"],
+     ["more", "<heart>", "stuff"]),
+    ("full", "so f**kguuuuud",
+     ["so", "f", "*", "*", "kguud", "<elongated>"],
+     ["so", "f**kguuuuud", "<censored>"]),
+    ("full", "@https://t.co/x hi",
+     ["@", "<url>", "hi"],
+     ["<user>", "://", "t", ".", "co", "/", "x", "hi"]),
+    ("full", "#1 is #Hello_World-2",
+     ["#", "<number>", "is", "<hashtag>", "hello", "world", "</hashtag>",
+      "-", "<number>"],
+     ["<hashtag>", "1", "</hashtag>", "is", "<hashtag>", "hello", "world",
+      "2", "</hashtag>"]),
+    ("fast", "the new #TwinPeaks",
+     ["the", "new", "Twin", "Peaks"],
+     ["the", "new", "#", "TwinPeaks"]),
+    ("full", "season :-D YAAAAAAY AND TWO",
+     ["season", ":", "-", "<allcaps>", "d", "yaay", "<elongated>", "and",
+      "two", "</allcaps>"],
+     ["season", "<laugh>", "<allcaps>", "yaay", "<elongated>", "and", "two",
+      "</allcaps>"]),
+    ("single", "5$ABC",
+     ["<number>", "$ABC"],
+     ["5$", "ABC", "<allcaps>"]),
+]
+
+
+@pytest.mark.parametrize("tokenizer", [SocialTokenizer, Tokenizer])
+def test_typed_tokens_match_tokenize(tokenizer, docs):
+    for lowercase in (False, True):
+        tok = tokenizer(lowercase=lowercase)
+        for doc in docs:
+            typed = tok.tokenize_typed(doc)
+            assert [token for token, _type in typed] == tok.tokenize(doc)
+            assert all(_type for token, _type in typed)
+
+
+def test_typed_types():
+    typed = dict(SocialTokenizer().tokenize_typed(
+        "#TwinPeaks @user http://t.co/x :-) f**k *really* hello"))
+    assert typed == {"#TwinPeaks": "HASHTAG", "@user": "USER",
+                     "http://t.co/x": "URL", ":-)": "LTR_FACE",
+                     "f**k": "CENSORED", "*really*": "EMPHASIS",
+                     "hello": "WORD"}
+
+
+@pytest.mark.parametrize("name", ["full", "every", "tags"])
+def test_typed_agrees_on_separate_tokens(name, configs):
+    processor = TextPreProcessor(**configs[name])
+    typed = TextPreProcessor(typed_tokens=True, **configs[name])
+    for doc in AGREE:
+        assert typed.pre_process_doc(doc) == processor.pre_process_doc(doc)
+
+
+@pytest.mark.parametrize("name,doc,string_output,typed_output", DIFFERENCES)
+def test_typed_differences(name, doc, string_output, typed_output, configs):
+    processor = TextPreProcessor(**configs[name])
+    typed = TextPreProcessor(typed_tokens=True, **configs[name])
+    assert processor.pre_process_doc(doc) == string_output
+    assert typed.pre_process_doc(doc) == typed_output
+
+
+def test_typed_annotations_are_tags(configs):
+    typed = TextPreProcessor(typed_tokens=True, **configs["full"])
+    tokens = typed.pre_process_doc_typed("I'M SOOOO HAPPY!!! #yay")
+    assert [t for t, _type in tokens if _type == "TAG"] == [
+        "<allcaps>", "<elongated>", "</allcaps>", "<repeated>", "<hashtag>",
+        "</hashtag>"]